@@ -0,0 +1,61 @@
+# Compares the per-file parse and clean time of the Kyushu archive loader before
+# and after vectorizing it. A synthetic file with a year of hourly rows (plus the
+# header row and trailing empty rows the real files contain, see
+# synthetic_files.py) is read the same way japan_kyushu reads the downloaded csv.
+# Run from the root of the repository:
+#   python -m benchmarks.bench_kyushu_cleaning
+import io
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_files import make_kyushu_csv
+from data_scrapers.japan_kyushu.japan_kyushu import COLUMNS, clean_kyushu_data, split_demand_supply
+
+def clean_with_row_loop(df):
+    """
+    The cleaning code japan_kyushu used before it was vectorized.
+    """
+    dflist = []
+    for i in range(1, len(df)):
+        data_list = list(df.iloc[i])
+        if not np.all(pd.isna(data_list)):
+            dflist.append(data_list)
+    df = pd.DataFrame(dflist, columns=list(df.iloc[0]))
+    df.columns = COLUMNS
+    df['Region'] = 'Kyushu'
+    df['Unit'] = 'MWh'
+    demand_df = df[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
+    demand_df.sort_values(by=['Date_Time'], ascending=False, inplace=True)
+    supply_df = df.drop('Area_Demand', axis=1)
+    supply_df = pd.melt(supply_df, id_vars=['Date_Time', 'Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
+    supply_df.sort_values(by=['Date_Time', 'Fuel_Type'], ascending=False, inplace=True)
+    return demand_df, supply_df
+
+def clean_vectorized(df):
+    return split_demand_supply(clean_kyushu_data(df))
+
+def time_parse(content, clean, repeat=3):
+    """
+    :param content: bytes of the csv file
+    :param clean: function turning the raw dataframe into (demand_df, supply_df)
+    :param repeat: number of runs, the fastest one is reported
+    :return: fastest read and clean time in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        clean(pd.read_csv(io.BytesIO(content), encoding='shift-jis'))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    content = make_kyushu_csv('2021-04-01', 8760)
+    before = time_parse(content, clean_with_row_loop)
+    after = time_parse(content, clean_vectorized)
+    print('Kyushu per-file parse time (8760 hourly rows)')
+    print('  row loop:   {:8.3f}s'.format(before))
+    print('  vectorized: {:8.3f}s'.format(after))
+    print('  speedup:    {:8.1f}x'.format(before / after))
+
+if __name__ == '__main__':
+    main()
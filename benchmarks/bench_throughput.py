@@ -0,0 +1,333 @@
+# Throughput and peak memory of every archive loader, the JEPX spot csv
+# reader, the Vietnam pdf parser and the realtime csv parser of every region,
+# on synthetic files (see synthetic_files.py) instead of the utilities' servers.
+# 1x is the number and size of the files each source publishes today; 10x and
+# 100x read the same files 10 and 100 times over (the dates repeat, so the
+# loaders take their sorting path). The loaders run unchanged: only their
+# landing page and download functions are replaced, so each synthetic file is
+# parsed exactly as its downloaded copy would be. Loaders that download with
+# http_cache.get instead of archive_sync get their files from a replay cache.
+# The values every case returns are checked against the range of the synthetic
+# files (see check_values), so a loader producing wrong numbers fails instead
+# of being measured.
+# Every case runs in a fresh process, so its peak memory (the growth of the
+# process's maximum resident set size) is not affected by earlier cases, and a
+# case running out of memory is reported as failed instead of ending the run.
+# Run from the root of the repository:
+#   python -m benchmarks.bench_throughput [--cases Kyushu JEPX] [--scales 1 10]
+import argparse
+import importlib
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+import numpy as np
+import pandas as pd
+import requests
+from benchmarks import synthetic_files
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_sync import SyncedFile
+from data_scrapers.japan_realtime.realtime_csv import (FIVE_MIN_LENGTH, HOURLY_LENGTH, format_rows,
+                                                        parse_realtime_csv)
+from data_scrapers.japan_realtime.realtime_poller import REALTIME_SCRAPERS
+from data_scrapers.japan_system_price.japan_archived import COLUMNS, read_spot_csv
+from data_scrapers.vietnam.vietnam_past_generation import get_generation
+
+SCALES = [1, 10, 100]
+# urls the synthetic files are recorded under in the replay cache
+STAND_IN_URL = 'https://stand-in.invalid/'
+# cases taking less than this are repeated and the mean time is reported
+MIN_SECONDS = 0.5
+# plausible ranges of the values read from the synthetic files: an hour of
+# demand or supply of one region (the largest, Tokyo, peaks around 60 GW), a
+# realtime value in MW or %, a JEPX price and a month of Vietnam's generation.
+# The synthetic files hold no negative values (real pumped storage and
+# interconnector flows can be negative)
+MAX_HOURLY_MWH = 100000
+MAX_REALTIME_VALUE = 100000
+MAX_PRICE = 1000
+MAX_MONTHLY_MWH = 10 ** 8
+
+# source -> (generator, file extension, first period of every file today)
+ARCHIVE_FILES = {
+    'Tohoku': (synthetic_files.make_tohoku_csv, '.csv', pd.date_range('2016-04-01', '2021-04-01', freq='12MS')),
+    'Chugoku': (synthetic_files.make_chugoku_csv, '.csv', pd.date_range('2016-04-01', '2021-04-01', freq='12MS')),
+    'Shikoku': (synthetic_files.make_shikoku_excel, '.xlsx', pd.date_range('2016-04-01', '2021-04-01', freq='12MS')),
+    'Hokuriku': (synthetic_files.make_hokuriku_csv, '.csv', pd.date_range('2016-04-01', '2022-03-01', freq='MS')),
+    'Kyushu': (synthetic_files.make_kyushu_csv, '.csv', pd.date_range('2016-04-01', '2021-04-01', freq='12MS')),
+    'Tokyo': (synthetic_files.make_tokyo_csv, '.csv', pd.date_range('2016-01-01', '2022-01-01', freq='YS')),
+    'Kansai': (synthetic_files.make_kansai_csv, '.csv', pd.date_range('2016-01-01', '2022-01-01', freq='YS')),
+    'Chubu': (synthetic_files.make_chubu_csv, '.csv', pd.date_range('2016-04-01', '2021-04-01', freq='12MS')),
+    'Hokkaido': (synthetic_files.make_hokkaido_csv, '.csv', pd.date_range('2016-04-01', '2022-01-01', freq='QS-APR')),
+    'JEPX': (synthetic_files.make_jepx_csv, '.csv', pd.date_range('2005-04-01', '2021-04-01', freq='12MS')),
+    'Vietnam_PDF': (synthetic_files.make_vietnam_pdf, '.pdf', pd.date_range('2020-10-01', '2022-02-01', freq='MS')),
+}
+
+# region -> (module, function returning (demand_df, supply_df) or a demand df,
+#            functions listing the urls to download)
+ARCHIVE_LOADERS = {
+    'Tohoku': ('data_scrapers.japan_tohoku.japan_tohoku', 'read_tohoku_data', ['get_csv_urls']),
+    'Chugoku': ('data_scrapers.japan_chugoku.japan_chugoku', 'read_chugoku_data', ['get_csv_urls']),
+    'Shikoku': ('data_scrapers.japan_shikoku.japan_shikoku', 'read_shikoku_data', ['get_page', 'get_excel_urls']),
+    'Hokuriku': ('data_scrapers.japan_hokuriku.japan_hokuriku', 'read_hokuriku_data', ['get_page', 'get_csv_urls']),
+    'Kyushu': ('data_scrapers.japan_kyushu.japan_kyushu', 'read_kyushu_data', ['get_csv_urls']),
+    'Tokyo': ('data_scrapers.japan_tokyo.japan_tokyo', 'read_tokyo_data', ['get_page', 'get_csv_urls']),
+    'Kansai': ('data_scrapers.japan_kansai.japan_kansai', 'read_kansai_csv', []),
+    'Chubu': ('data_scrapers.japan_chubu.japan_chubu', 'read_chubu_csv', []),
+    'Hokkaido': ('data_scrapers.japan_hokkaido.japan_hokkaido', 'read_hokkaido_csv', []),
+}
+
+Measurement = namedtuple('Measurement', ['case', 'scale', 'rows', 'seconds', 'peak_bytes', 'error'])
+
+def write_fixtures(fixtures_dir, sources=None):
+    """
+    Writes the synthetic files of today's volume of every source.
+    :param fixtures_dir: folder to write the files to
+    :param sources: list of keys of ARCHIVE_FILES, None for every source
+    :return: dictionary of source -> list of file paths
+    """
+    paths = {}
+    for source in sources or list(ARCHIVE_FILES):
+        make_file, extension, periods = ARCHIVE_FILES[source]
+        paths[source] = []
+        for i, period in enumerate(periods):
+            path = os.path.join(fixtures_dir, '{}_{}{}'.format(source, i, extension))
+            with open(path, 'wb') as f:
+                f.write(make_file(period, seed=i))
+            paths[source].append(path)
+    return paths
+
+def record_fixtures(cache_dir, paths):
+    """
+    Saves local files in a replay cache, as if they had been downloaded.
+    :param cache_dir: root folder of the cache
+    :param paths: list of local files
+    :return: list of the urls the files are served under
+    """
+    urls = []
+    for path in paths:
+        url = STAND_IN_URL + os.path.basename(path)
+        with open(path, 'rb') as f:
+            http_cache.store_response(cache_dir, requests.Request('GET', url).prepare(), 200, {}, f.read())
+        urls.append(url)
+    return urls
+
+def make_local_sync(paths):
+    """
+    :param paths: list of local files
+    :return: a stand-in for archive_sync.sync_files that parses the local files
+             in order, whatever urls it is given
+    """
+    def sync_files(source, urls, session=None, headers=None, parse=None, **kwargs):
+        return [SyncedFile(path, path, True, parse(path) if parse else None) for path in paths]
+    return sync_files
+
+def check_values(values, name, upper):
+    """
+    Checks values read from the synthetic files: numbers (not text) that are
+    finite and within [0, upper]. Missing values, from placeholders, are allowed.
+    :param values: pandas Series or list of values
+    :param name: what the values are, for the error message
+    :param upper: largest plausible value
+    :raise ValueError: if a value is not a number or is out of range
+    """
+    values = pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(values) and values.notna().any():
+        raise ValueError('{} are not numbers ({})'.format(name, values.dtype))
+    values = values.astype('float64').dropna()
+    if not np.isfinite(values).all():
+        raise ValueError('{} are not all finite'.format(name))
+    if len(values) and (values.min() < 0 or values.max() > upper):
+        raise ValueError('{} range from {} to {}, outside [0, {}]'.format(name, values.min(), values.max(), upper))
+
+def check_loader_values(data, region):
+    """
+    :param data: result of a loader: a demand df or a tuple (demand_df, supply_df)
+    :param region: the region name
+    """
+    demand_df, supply_df = data if isinstance(data, tuple) else (data, None)
+    demand = 'Area_Demand' if 'Area_Demand' in demand_df.columns else 'Demand'
+    check_values(demand_df[demand], '{} demand values'.format(region), MAX_HOURLY_MWH)
+    if supply_df is not None and 'Supply' in supply_df.columns:
+        check_values(supply_df['Supply'], '{} supply values'.format(region), MAX_HOURLY_MWH)
+    elif supply_df is not None:
+        for fuel in supply_df.columns:
+            check_values(supply_df[fuel], '{} {} supply values'.format(region, fuel), MAX_HOURLY_MWH)
+
+def count_rows(data):
+    """
+    :param data: result of a loader: a demand df or a tuple (demand_df, supply_df)
+    :return: number of demand rows, i.e. hours read
+    """
+    return len(data[0]) if isinstance(data, tuple) else len(data)
+
+def run_archive_loader(region, paths, cache_dir=None):
+    """
+    Runs a region's loader on local files.
+    :param cache_dir: replay cache the paths were recorded in (see record_fixtures),
+                      for loaders downloading with http_cache.get; the paths are then urls
+    :return: number of hours read
+    """
+    module_name, function, url_functions = ARCHIVE_LOADERS[region]
+    module = importlib.import_module(module_name)
+    if cache_dir is not None:
+        http_cache.configure('replay', cache_dir)
+    patches = [mock.patch.object(module, name, lambda *args: paths) for name in url_functions]
+    if hasattr(module, 'sync_files'):
+        patches.append(mock.patch.object(module, 'sync_files', make_local_sync(paths)))
+    for patch in patches:
+        patch.start()
+    try:
+        data = getattr(module, function)()
+    finally:
+        mock.patch.stopall()
+    check_loader_values(data, region)
+    return count_rows(data)
+
+def run_jepx(paths):
+    """
+    Reads the spot csvs the way japan_archived.get_price_data does.
+    :return: number of half hours read
+    """
+    df = pd.concat([read_spot_csv(path) for path in paths], ignore_index=True)
+    for column in list(COLUMNS.values())[2:]:
+        check_values(df[column], 'JEPX ' + column, MAX_PRICE)
+    return len(df.sort_values(by='Date_Time', kind='stable', ignore_index=True))
+
+def run_vietnam_pdfs(paths):
+    """
+    Parses the first page of every pdf in this process.
+    :return: number of pdfs parsed
+    """
+    generation = [get_generation(path) for path in paths]
+    check_values([month['Generation'] for month in generation], 'Vietnam generation', MAX_MONTHLY_MWH)
+    return len(generation)
+
+def run_realtime(region, content, scale):
+    """
+    Parses and formats every published row of a realtime csv covering `scale` days.
+    :return: number of table rows parsed
+    """
+    scraper = importlib.import_module(REALTIME_SCRAPERS[region])
+    hourly, five_min = parse_realtime_csv(content, HOURLY_LENGTH * scale, FIVE_MIN_LENGTH * scale)
+    rows = format_rows(hourly, region, scraper.HOURLY_FIELDS, 0) + format_rows(five_min, region,
+                                                                               scraper.FIVE_MIN_FIELDS, 0)
+    check_values([row['Value'] for row in rows], '{} realtime values'.format(region), MAX_REALTIME_VALUE)
+    return len(hourly.date_time) + len(five_min.date_time)
+
+def get_peak_rss():
+    """
+    :return: peak resident set size of this process so far, in bytes
+    """
+    # on Linux the maximum in getrusage can include the parent's memory at
+    # fork, while VmHWM only covers this process's own memory
+    if os.path.isfile('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure(case, scale, run, *args):
+    """
+    Runs a case until MIN_SECONDS have passed; meant to run in a fresh process.
+    :param case: name of the case
+    :param scale: the data volume, 1 for today's
+    :param run: function returning the number of rows handled
+    :param args: arguments of run
+    :return: a Measurement
+    """
+    # the loaders' pandas warnings would break up the report
+    warnings.simplefilter('ignore')
+    # imports are not part of the measurement
+    for module_name, function, url_functions in ARCHIVE_LOADERS.values():
+        importlib.import_module(module_name)
+    for module_name in REALTIME_SCRAPERS.values():
+        importlib.import_module(module_name)
+    baseline = get_peak_rss()
+    runs, start = 0, time.perf_counter()
+    while runs == 0 or time.perf_counter() - start < MIN_SECONDS:
+        rows = run(*args)
+        runs += 1
+    seconds = (time.perf_counter() - start) / runs
+    return Measurement(case, scale, rows, seconds, get_peak_rss() - baseline, None)
+
+def measure_in_process(case, scale, run, *args):
+    """
+    :return: a Measurement from a fresh process, with the error if the case failed
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        try:
+            return executor.submit(measure, case, scale, run, *args).result()
+        except Exception as e:
+            return Measurement(case, scale, None, None, None, '{}: {}'.format(type(e).__name__, e))
+
+def get_cases(fixtures, scales, realtime_regions=(), cache_dir=None):
+    """
+    :param fixtures: dictionary of source -> list of file paths, from write_fixtures
+    :param scales: list of data volumes
+    :param realtime_regions: regions whose realtime csv parser is measured
+    :param cache_dir: folder of the replay cache of the loaders without archive_sync
+    :return: list of (case, scale, run, args) tuples
+    """
+    cases = []
+    replayed = {}
+    for source, paths in fixtures.items():
+        if source in ARCHIVE_LOADERS and not hasattr(importlib.import_module(ARCHIVE_LOADERS[source][0]),
+                                                     'sync_files'):
+            replayed[source] = record_fixtures(cache_dir, paths)
+    for scale in scales:
+        for source, paths in fixtures.items():
+            if source in replayed:
+                cases.append((source, scale, run_archive_loader, (source, replayed[source] * scale, cache_dir)))
+            elif source in ARCHIVE_LOADERS:
+                cases.append((source, scale, run_archive_loader, (source, paths * scale)))
+            elif source == 'JEPX':
+                cases.append((source, scale, run_jepx, (paths * scale,)))
+            elif source == 'Vietnam_PDF':
+                cases.append((source, scale, run_vietnam_pdfs, (paths * scale,)))
+        for region in realtime_regions:
+            scraper = importlib.import_module(REALTIME_SCRAPERS[region])
+            content = synthetic_files.make_realtime_csv('2022-05-01', len(scraper.HOURLY_FIELDS),
+                                                        len(scraper.FIVE_MIN_FIELDS), days=scale, filled=1)
+            cases.append(('Realtime_' + region, scale, run_realtime, (region, content, scale)))
+    return cases
+
+def format_measurement(m):
+    """
+    :param m: a Measurement
+    :return: one line of the report
+    """
+    if m.error is not None:
+        return '{:<18} {:>5}x  failed: {}'.format(m.case, m.scale, m.error)
+    return '{:<18} {:>5}x {:>11} {:>10.3f} {:>12.0f} {:>10.1f}'.format(
+        m.case, m.scale, m.rows, m.seconds, m.rows / m.seconds, m.peak_bytes / 2 ** 20)
+
+def main():
+    cases = list(ARCHIVE_FILES) + ['Realtime']
+    parser = argparse.ArgumentParser(description='Measure the throughput of every loader and parser.')
+    parser.add_argument('--cases', nargs='+', choices=cases, help='cases to run (default: all)')
+    parser.add_argument('--scales', nargs='+', type=int, default=SCALES,
+                        help='data volumes relative to today (default: 1 10 100)')
+    args = parser.parse_args()
+    selected = args.cases or cases
+
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        fixtures = write_fixtures(fixtures_dir, [case for case in selected if case in ARCHIVE_FILES])
+        realtime_regions = list(REALTIME_SCRAPERS) if 'Realtime' in selected else []
+        print('{:<18} {:>6} {:>11} {:>10} {:>12} {:>10}'.format('case', 'scale', 'rows', 'seconds',
+                                                                 'rows/s', 'peak MB'))
+        for case, scale, run, case_args in get_cases(fixtures, args.scales, realtime_regions,
+                                                     os.path.join(fixtures_dir, 'http_cache')):
+            print(format_measurement(measure_in_process(case, scale, run, *case_args)), flush=True)
+
+if __name__ == '__main__':
+    main()
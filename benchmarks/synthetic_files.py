@@ -0,0 +1,285 @@
+# Generators of synthetic files in the exact layout of every source, so the
+# loaders and parsers can be benchmarked without reaching the utilities:
+# the Shift-JIS title and header lines, the `DATE,TIME,` table headers, the
+# placeholders ('|', '－') and empty trailing rows and columns of the real files.
+# Values are random but in the published range (10,000 kW units for most
+# utilities). Every generator returns the content of one file as bytes; the
+# first hour of a file is passed in, so consecutive files cover consecutive periods.
+import io
+import numpy as np
+import pandas as pd
+from data_scrapers.japan_system_price.japan_archived import COLUMNS
+
+# value columns after the date/time columns: demand and the eleven fuel types
+VALUE_COLUMNS = 12
+JAPANESE_HEADER = ['エリア需要', '原子力', '火力', '水力', '地熱', 'バイオマス', '太陽光発電実績',
+                   '太陽光出力制御量', '風力発電実績', '風力出力制御量', '揚水', '連系線']
+
+def get_date_times(start, periods, freq='h'):
+    """
+    :param start: the first date and time, e.g. '2016-04-01'
+    :param periods: number of rows
+    :param freq: pandas frequency of the rows
+    :return: a DatetimeIndex
+    """
+    return pd.date_range(start, periods=periods, freq=freq)
+
+def get_hours(start, months):
+    """
+    :param start: the first hour of a file
+    :param months: number of months the file covers
+    :return: number of hours in the file
+    """
+    start = pd.Timestamp(start)
+    return (start + pd.DateOffset(months=months) - start) // pd.Timedelta(hours=1)
+
+def get_times(date_times):
+    """
+    :param date_times: a DatetimeIndex
+    :return: times without a leading zero, e.g. '9:00', as most utilities write them
+    """
+    return pd.Series(date_times.hour.astype(str) + date_times.strftime(':%M'))
+
+def get_values(rows, columns=VALUE_COLUMNS, seed=0, placeholder=None, share=0.02):
+    """
+    :param rows: number of rows
+    :param columns: number of value columns
+    :param seed: seed of the random values
+    :param placeholder: text replacing a share of the cells, e.g. '|', None for no placeholders
+    :param share: share of the cells replaced by the placeholder
+    :return: a dataframe of values as text
+    """
+    rng = np.random.default_rng(seed)
+    values = pd.DataFrame(rng.integers(0, 1500, size=(rows, columns)).astype(str))
+    if placeholder is not None:
+        values = values.mask(rng.random(size=(rows, columns)) < share, placeholder)
+    return values
+
+def to_csv_bytes(lines, data, encoding='shift_jis', empty_rows=0):
+    """
+    :param lines: list of lines written before the data (titles and header)
+    :param data: dataframe of the data rows, as text
+    :param encoding: encoding of the file
+    :param empty_rows: number of trailing rows with only commas
+    :return: the file content
+    """
+    body = data.to_csv(header=False, index=False, lineterminator='\r\n')
+    tail = (',' * (data.shape[1] - 1) + '\r\n') * empty_rows
+    return ('\r\n'.join(lines) + '\r\n' + body + tail).encode(encoding)
+
+def make_tohoku_csv(start, hours=None, seed=0):
+    """
+    Tohoku: one DATE_TIME column, no title lines.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours).strftime('%Y/%m/%d %H:%M')
+    data = pd.concat([pd.Series(date_times), get_values(hours, seed=seed)], axis=1)
+    return to_csv_bytes([','.join(['DATE_TIME'] + ['VALUE_{}'.format(i) for i in range(VALUE_COLUMNS)])],
+                        data, 'ascii')
+
+def make_chugoku_csv(start, hours=None, seed=0):
+    """
+    Chugoku: two title lines, DATE and TIME columns, '|' placeholders and
+    trailing empty rows.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours)
+    data = pd.concat([pd.Series(date_times.strftime('%Y/%m/%d')), pd.Series(date_times.strftime('%H:%M')),
+                      get_values(hours, seed=seed, placeholder='|')], axis=1)
+    lines = ['AREA SUPPLY AND DEMAND RESULTS' + ',' * (VALUE_COLUMNS + 1),
+             'UNIT: 10MWh' + ',' * (VALUE_COLUMNS + 1),
+             ','.join(['DATE', 'TIME'] + ['VALUE_{}'.format(i) for i in range(VALUE_COLUMNS)])]
+    return to_csv_bytes(lines, data, 'ascii', empty_rows=24)
+
+def make_shikoku_excel(start, hours=None, seed=0):
+    """
+    Shikoku: an Excel sheet with eight title rows, date and time cells, '－'
+    placeholders, a total column and a footnote row. Requires openpyxl, as does reading it.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours)
+    # dates and times are date and time cells, not text
+    data = pd.concat([pd.Series(date_times.normalize().to_pydatetime(), dtype=object),
+                      pd.Series(date_times.time, dtype=object),
+                      get_values(hours, seed=seed, placeholder='－'),
+                      get_values(hours, columns=1, seed=seed + 1)], axis=1)
+    data.columns = range(data.shape[1])
+    width = data.shape[1]
+    title = pd.DataFrame([['需給実績'] + [None] * (width - 1)] + [[None] * width] * 7)
+    header = pd.DataFrame([['日付', '時刻'] + JAPANESE_HEADER + ['合計']])
+    footer = pd.DataFrame([['※ 数値は速報値です'] + [None] * (width - 1)])
+    sheet = pd.concat([title, header, data, footer], ignore_index=True)
+    output = io.BytesIO()
+    sheet.to_excel(output, header=False, index=False)
+    return output.getvalue()
+
+def make_hokuriku_csv(start, hours=None, seed=0):
+    """
+    Hokuriku: one month per file, five title lines, a DATE,TIME, header
+    and an empty last column.
+    """
+    hours = hours or get_hours(start, 1)
+    date_times = get_date_times(start, hours)
+    data = pd.concat([pd.Series(date_times.strftime('%Y/%m/%d')), pd.Series(date_times.strftime('%H:%M')),
+                      get_values(hours, seed=seed), pd.Series([''] * hours)], axis=1)
+    lines = ['AREA SUPPLY AND DEMAND RESULTS', 'UNIT: 10MWh', '', 'HOKURIKU', '',
+             ','.join(['DATE', 'TIME'] + ['VALUE_{}'.format(i) for i in range(VALUE_COLUMNS)]) + ',']
+    return to_csv_bytes(lines, data, 'ascii', empty_rows=3)
+
+def make_kyushu_csv(start, hours=None, seed=0, empty_rows=24):
+    """
+    Kyushu: a Shift-JIS title line, the Japanese header as the first data
+    row and trailing empty rows.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours).strftime('%Y/%m/%d %H:%M')
+    data = pd.concat([pd.Series(date_times), get_values(hours, seed=seed)], axis=1)
+    lines = [','.join(['エリア需給実績'] + [''] * VALUE_COLUMNS), ','.join(['日時'] + JAPANESE_HEADER)]
+    return to_csv_bytes(lines, data, empty_rows=empty_rows)
+
+def make_tokyo_csv(start, hours=None, seed=0):
+    """
+    Tokyo: an update line, then DATE, TIME and the demand in 10,000 kW.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours)
+    data = pd.concat([pd.Series(date_times.strftime('%Y/%m/%d')), get_times(date_times),
+                      get_values(hours, columns=1, seed=seed)], axis=1)
+    return to_csv_bytes(['{} UPDATE'.format(date_times[-1].strftime('%Y/%m/%d %H:%M')),
+                         'DATE,TIME,DEMAND(10MW)'], data, 'ascii')
+
+def make_kansai_csv(start, hours=None, seed=0):
+    """
+    Kansai: a Shift-JIS title line and header, one date-time column and two
+    empty columns at the end of every row.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours).strftime('%Y/%m/%d %H:%M')
+    # the files end every row with empty columns
+    data = pd.concat([pd.Series(date_times), get_values(hours, seed=seed), pd.Series([''] * hours),
+                      pd.Series([''] * hours)], axis=1)
+    lines = ['エリア需給実績' + ',' * (VALUE_COLUMNS + 2), ','.join(['日時'] + JAPANESE_HEADER) + ',,']
+    return to_csv_bytes(lines, data)
+
+def make_chubu_csv(start, hours=None, seed=0):
+    """
+    Chubu: four Shift-JIS title lines, then date (月日) and time (時刻) columns.
+    """
+    hours = hours or get_hours(start, 12)
+    date_times = get_date_times(start, hours)
+    data = pd.concat([pd.Series(date_times.strftime('%Y/%m/%d')), get_times(date_times),
+                      get_values(hours, seed=seed)], axis=1)
+    lines = ['中部エリア需給実績' + ',' * (VALUE_COLUMNS + 1), '単位：万kWh' + ',' * (VALUE_COLUMNS + 1),
+             ',' * (VALUE_COLUMNS + 1), ',' * (VALUE_COLUMNS + 1),
+             ','.join(['月日', '時刻'] + JAPANESE_HEADER)]
+    return to_csv_bytes(lines, data)
+
+def make_hokkaido_csv(start, hours=None, seed=0):
+    """
+    Hokkaido: one quarter per file, an empty first row, the date only on the
+    first hour of a day, times written as '13時' and a supply total column.
+    """
+    hours = hours or get_hours(start, 3)
+    date_times = get_date_times(start, hours)
+    # the date is only written on the first hour of a day, times read '13時'
+    dates = pd.Series(date_times.strftime('%Y/%m/%d')).where(date_times.hour == 0, '')
+    data = pd.concat([dates, pd.Series(date_times.hour.astype(str) + '時'), get_values(hours, seed=seed),
+                      get_values(hours, columns=1, seed=seed + 1)], axis=1)
+    lines = ['北海道エリア需給実績' + ',' * (VALUE_COLUMNS + 2), '単位：MWh' + ',' * (VALUE_COLUMNS + 2),
+             ','.join(['月日', '時刻'] + JAPANESE_HEADER + ['供給力合計']),
+             ',' * (VALUE_COLUMNS + 2)]
+    return to_csv_bytes(lines, data)
+
+def make_jepx_csv(start, days=None, seed=0):
+    """
+    JEPX spot market results: a Shift-JIS header with more columns than the
+    loader keeps, and 48 time codes per day.
+    :param start: the first day of the fiscal year
+    :param days: number of days, 48 rows each, a year by default
+    """
+    days = days or get_hours(start, 12) // 24
+    japanese = list(COLUMNS)
+    header = (japanese[:2] + ['売り入札量(kWh)', '買い入札量(kWh)', '約定総量(kWh)'] + japanese[2:] +
+              ['回避可能原価全国値(円/kWh)', 'スポット・時間前平均価格(円/kWh)'])
+    rows = days * 48
+    rng = np.random.default_rng(seed)
+    dates = np.repeat(get_date_times(start, days, 'D').strftime('%Y/%m/%d'), 48)
+    volumes = pd.DataFrame(rng.integers(10 ** 7, 10 ** 9, size=(rows, 3)).astype(str))
+    prices = pd.DataFrame(np.round(rng.uniform(0.01, 30, size=(rows, 12)), 2).astype(str))
+    data = pd.concat([pd.Series(dates), pd.Series(np.tile(np.arange(1, 49), days).astype(str)), volumes,
+                      prices], axis=1)
+    return to_csv_bytes([','.join(header)], data)
+
+def make_realtime_csv(day, hourly_fields=4, five_min_fields=2, days=1, filled=0.5, seed=0):
+    """
+    Realtime demand csv: an update line and peak supply table, then the
+    hourly and 5-minute tables, each starting with a DATE,TIME, line.
+    :param day: the first day of the file
+    :param hourly_fields: number of value columns of the hourly table
+    :param five_min_fields: number of value columns of the 5-minute table
+    :param days: number of days covered by the tables
+    :param filled: share of the rows already published; later rows are 0 or empty
+    """
+    rng = np.random.default_rng(seed)
+    lines = ['{} UPDATE'.format(pd.Timestamp(day).strftime('%Y/%m/%d %H:%M')),
+             'ピーク時供給力(万kW),時間帯,供給力情報更新日,供給力情報更新時刻',
+             '1500,17:00〜18:00,{},8:30'.format(pd.Timestamp(day).strftime('%Y/%m/%d')), '']
+    for freq, fields, empty in (('h', hourly_fields, '0'), ('5min', five_min_fields, '')):
+        date_times = get_date_times(day, days * (24 if freq == 'h' else 288), freq)
+        published = int(len(date_times) * filled)
+        lines.append(','.join(['DATE', 'TIME'] + ['VALUE_{}'.format(i) for i in range(fields)]))
+        for i, date_time in enumerate(date_times):
+            values = rng.integers(100, 1500, size=fields).astype(str) if i < published else [empty] * fields
+            lines.append(','.join(['{}/{}/{}'.format(date_time.year, date_time.month, date_time.day),
+                                   '{}:{:02d}'.format(date_time.hour, date_time.minute)] + list(values)))
+        lines.append('')
+    return '\r\n'.join(lines).encode('shift_jis')
+
+def make_pdf(pages):
+    """
+    :param pages: list of pages, each a list of lines of ASCII text
+    :return: content of a PDF with one Helvetica text object per page
+    """
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for lines in pages:
+        text = ' '.join('({}) Tj 0 -14 Td'.format(line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)'))
+                        for line in lines)
+        stream = 'BT /F1 11 Tf 50 800 Td {} ET'.format(text)
+        objects.append('<< /Length {} >>\nstream\n{}\nendstream'.format(len(stream), stream))
+        objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {} 0 R '
+                       '/Resources << /Font << /F1 3 0 R >> >> >>'.format(len(objects)))
+        page_ids.append(len(objects))
+    objects[1] = '<< /Type /Pages /Kids [{}] /Count {} >>'.format(
+        ' '.join('{} 0 R'.format(i) for i in page_ids), len(page_ids))
+
+    content = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(content))
+        content += '{} 0 obj\n{}\nendobj\n'.format(i, obj).encode('latin-1')
+    xref = len(content)
+    content += 'xref\n0 {}\n0000000000 65535 f \n'.format(len(objects) + 1).encode()
+    content += ''.join('{:010d} 00000 n \n'.format(offset) for offset in offsets).encode()
+    content += 'trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n'.format(len(objects) + 1, xref).encode()
+    return content
+
+def make_vietnam_pdf(month, seed=0, pages=3):
+    """
+    Vietnam monthly market report: the month and total generation (million
+    kWh, decimal comma) on the first page, then daily values and price tables.
+    :param month: the month of the report, e.g. '2021-01'
+    :param pages: number of pages; only the first one is parsed
+    """
+    rng = np.random.default_rng(seed)
+    month = pd.Timestamp(month)
+    daily = rng.uniform(500, 800, size=month.days_in_month)
+    first_page = ['THONG TIN THI TRUONG DIEN THANG {}'.format(month.strftime('%m/%Y')),
+                  'San luong dien toan he thong: {:.2f} trieu kWh'.format(daily.sum()).replace('.', ','),
+                  'Cong suat lon nhat: {:.1f} MW'.format(rng.uniform(35000, 45000))]
+    first_page += ['Ngay {}: {:.2f} trieu kWh'.format(day, value) for day, value in enumerate(daily, start=1)]
+    other_pages = [['Bang {} - gia thi truong dien'.format(page)] +
+                   ['Chu ky {}: {:.2f} dong/kWh'.format(i, price) for i, price in
+                    enumerate(rng.uniform(500, 1500, size=48), start=1)] for page in range(2, pages + 1)]
+    return make_pdf([first_page] + other_pages)
@@ -0,0 +1,199 @@
+# Single entry point for every scraper. Instead of running each script on its
+# own, the selected sources are run concurrently on a process pool (the
+# archive loaders spend most of their time parsing, so threads would share one
+# CPU), and a report of each source's time and row count is printed at the end.
+#   archive:  the archive loader of every region, written through
+#             archive_output.write_archive (csv, or the Parquet dataset with --parquet)
+#   realtime: one poll of every Japanese realtime scraper (Vietnam's load and
+#             price scraper is not run: its NLDC contract is unverified, see
+#             vietnam_realtime_scraper)
+#   prices:   the JEPX spot price archive, then the latest day of prices
+# With --metrics, the stage durations, bytes, rows and HTTP status of every
+# source are exported too, see scrape_metrics. With --http-cache, every
+# request is recorded to or replayed from a local cache, see http_cache, so a
+# parser change can be re-run over recorded files without the network.
+# Run from the root of the repository:
+#   python -m data_scrapers archive realtime --regions Kyushu Tohoku --parquet
+#   python -m data_scrapers --workers 8 --metrics /var/lib/node_exporter/scrapers.prom
+#   python -m data_scrapers archive --http-cache replay --parquet
+import argparse
+import importlib
+import logging
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import write_archive
+from data_scrapers.japan_archive.national_dataset import ARCHIVE_LOADERS, load_region
+from data_scrapers.japan_realtime.realtime_poller import REALTIME_SCRAPERS, TimeoutSession
+from data_scrapers.japan_system_price.japan_archived import get_price_data
+from data_scrapers.japan_system_price.japan_daily_scraper import get_latest_data
+from data_scrapers.scrape_metrics import pop_records, record_failure, write_metrics
+
+# mode -> names of its sources; archive and realtime sources are region names
+SOURCES = {
+    'archive': list(ARCHIVE_LOADERS),
+    'realtime': list(REALTIME_SCRAPERS),
+    'prices': ['JEPX'],
+}
+
+# outcome of one source; error is the formatted traceback, None on success;
+# stages are the scrape_metrics.StageRecords measured while the source ran
+Result = namedtuple('Result', ['mode', 'source', 'rows', 'seconds', 'error', 'stages'])
+
+def run_archive(region, output_format='csv'):
+    """
+    :param region: the region name, a key of ARCHIVE_LOADERS
+    :param output_format: 'csv' or 'parquet'
+    :return: number of rows written
+    """
+    demand_df, supply_df = load_region(region)
+    return write_archive(demand_df, supply_df, region, output_format)
+
+def run_realtime(region, backfill=False):
+    """
+    :param region: the region name, a key of REALTIME_SCRAPERS
+    :param backfill: write every published row of the day, see the scrapers' main()
+    :return: number of rows written
+    """
+    with TimeoutSession() as session:
+        return importlib.import_module(REALTIME_SCRAPERS[region]).main(session, backfill)
+
+def run_prices(source, output_format='csv', incremental=False):
+    """
+    Runs the price archive, then the latest day of prices. Both write the
+    current year's Spot_Market_Trading_Results_Price file (the archive
+    rewrites it, the daily scraper appends to it), so they run one after the
+    other in one task instead of in separate worker processes.
+    :param source: 'JEPX'
+    :param output_format: 'csv' or 'parquet', for the archive
+    :param incremental: only write the archive years whose file changed
+    :return: number of rows written
+    """
+    return len(get_price_data(output_format, incremental)) + get_latest_data()
+
+RUNNERS = {'archive': run_archive, 'realtime': run_realtime, 'prices': run_prices}
+
+def run_source(mode, source, options):
+    """
+    Runs one source in a worker process. Errors are returned rather than
+    raised so one failing source does not stop the others, and recorded with
+    record_failure so the source's metrics show the failed run.
+    :param mode: 'archive', 'realtime' or 'prices'
+    :param source: a name in SOURCES[mode]
+    :param options: keyword arguments of the mode's runner
+    :return: a Result
+    """
+    start = time.monotonic()
+    try:
+        rows = RUNNERS[mode](source, **options)
+    except Exception as e:
+        record_failure(mode, source, e, time.monotonic() - start)
+        return Result(mode, source, None, time.monotonic() - start, traceback.format_exc(), pop_records())
+    return Result(mode, source, rows, time.monotonic() - start, None, pop_records())
+
+def get_jobs(modes, regions=None):
+    """
+    :param modes: list of modes to run
+    :param regions: list of region names to run, None for every region;
+                    the prices sources are national and always run
+    :return: list of (mode, source) tuples
+    """
+    return [(mode, source) for mode in modes for source in SOURCES[mode]
+            if regions is None or mode == 'prices' or source in regions]
+
+def run_sources(jobs, options, workers=None, cache=None):
+    """
+    :param jobs: list of (mode, source) tuples
+    :param options: dict of mode -> keyword arguments of the mode's runner
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param cache: arguments of http_cache.configure for every worker
+                  (mode, cache_dir, max_age), None to keep the environment's
+    :return: list of Results in the order the sources finished
+    """
+    start = time.monotonic()
+    results = []
+    # workers are not forked on every platform, so the cache is configured in each
+    with ProcessPoolExecutor(max_workers=workers, initializer=http_cache.configure if cache else None,
+                             initargs=cache or ()) as executor:
+        futures = {executor.submit(run_source, mode, source, options.get(mode, {})): (mode, source)
+                   for mode, source in jobs}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker died (e.g. BrokenProcessPool), so its records are lost
+                # and only the failure itself is recorded
+                mode, source = futures[future]
+                seconds = time.monotonic() - start
+                record_failure(mode, source, e, seconds)
+                results.append(Result(mode, source, None, seconds,
+                                      ''.join(traceback.format_exception(e)), pop_records(source)))
+    return results
+
+def format_report(results, seconds):
+    """
+    :param results: list of Results
+    :param seconds: wall time of the whole run
+    :return: the report as a string, one line per source, slowest first
+    """
+    lines = ['{:<10} {:<14} {:>10} {:>9}  {}'.format('mode', 'source', 'rows', 'seconds', 'status')]
+    for result in sorted(results, key=lambda result: -result.seconds):
+        rows = '-' if result.rows is None else result.rows
+        status = 'ok' if result.error is None else 'failed: ' + result.error.strip().splitlines()[-1]
+        lines.append('{:<10} {:<14} {:>10} {:>9.2f}  {}'.format(result.mode, result.source, rows,
+                                                              result.seconds, status))
+    total = sum(result.rows or 0 for result in results)
+    lines.append('{:<10} {:<14} {:>10} {:>9.2f}'.format('total', '', total, seconds))
+    return '\n'.join(lines)
+
+def main():
+    regions = sorted(set(SOURCES['archive']) | set(SOURCES['realtime']))
+    parser = argparse.ArgumentParser(prog='python -m data_scrapers',
+                                     description='Run the selected scrapers concurrently.')
+    parser.add_argument('modes', nargs='*', metavar='MODE',
+                        help='scrapers to run: {} (default: all)'.format(', '.join(SOURCES)))
+    parser.add_argument('--regions', nargs='+', choices=regions,
+                        help='regions to run (default: all); prices are always run')
+    parser.add_argument('--workers', type=int, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--parquet', action='store_true', help='write the archives to the Parquet datasets')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only write the price archive years whose file changed')
+    parser.add_argument('--backfill', action='store_true',
+                        help='write every published realtime row of the day instead of only the latest')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='export stage metrics to a Prometheus textfile (*.prom) or JSON lines')
+    parser.add_argument('--http-cache', choices=http_cache.MODES,
+                        help='record, replay or refresh the HTTP responses, see http_cache')
+    parser.add_argument('--http-cache-dir', default=http_cache.HTTP_CACHE_DIR,
+                        help='folder of the HTTP cache (default: %(default)s)')
+    parser.add_argument('--max-age', type=float, default=http_cache.DEFAULT_MAX_AGE,
+                        help='seconds a cached response is served in refresh mode (default: %(default)s)')
+    args = parser.parse_args()
+    unknown = set(args.modes) - set(SOURCES)
+    if unknown:
+        parser.error('unknown modes {}'.format(sorted(unknown)))
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    output_format = 'parquet' if args.parquet else 'csv'
+    options = {'archive': {'output_format': output_format},
+               'realtime': {'backfill': args.backfill},
+               'prices': {'output_format': output_format, 'incremental': args.incremental}}
+
+    cache = (args.http_cache, args.http_cache_dir, args.max_age) if args.http_cache else None
+
+    start = time.monotonic()
+    results = run_sources(get_jobs(args.modes or list(SOURCES), args.regions), options, args.workers, cache)
+    for result in results:
+        if result.error is not None:
+            logging.error('%s %s failed:\n%s', result.mode, result.source, result.error)
+    if args.metrics:
+        write_metrics(args.metrics, [stage for result in results for stage in result.stages])
+    print(format_report(results, time.monotonic() - start))
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+# Record/replay cache for the HTTP requests of every scraper. Landing pages
+# and data files are stored on disk, so parser changes can be re-run over the
+# whole archive at disk speed and without network access. The cache has three
+# modes:
+#   record:  every request goes to the network and its response is saved
+#   replay:  responses are only served from the cache; a request that was never
+#            recorded raises, so a replayed run cannot reach the network
+#   refresh: saved responses younger than max_age are served from the cache,
+#            older or missing ones are fetched and saved again; if the host
+#            cannot be reached, the stale response is served instead
+# Layout of the cache folder:
+#   bodies/<ab>/<sha256>:     response bodies named by their hash, so a file
+#                             served under several urls is stored once
+#   requests/<sha256>.json:   status, headers, body hash and fetch time of a
+#                             request, keyed by the hash of its method, url and Range
+# The cache is a requests transport adapter, so it works under any session:
+# the scrapers call get() of this module in place of requests.get, and
+# sessions made with new_session() (or passed to install()) use it as well.
+# Without a mode, requests go to the network as before. The mode is set with
+# configure(), or with the HTTP_CACHE_MODE, HTTP_CACHE_DIR and
+# HTTP_CACHE_MAX_AGE environment variables for scripts run on their own:
+#   HTTP_CACHE_MODE=record python -m data_scrapers.japan_tohoku.japan_tohoku
+#   HTTP_CACHE_MODE=replay python -m data_scrapers.japan_tohoku.japan_tohoku --parquet
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+MODES = ['record', 'replay', 'refresh']
+HTTP_CACHE_DIR = 'Http_Response_Cache'
+# seconds a saved response is served in refresh mode
+DEFAULT_MAX_AGE = 24 * 3600
+# headers kept with a response; bodies are stored decoded, so Content-Encoding is not.
+# Redirects are saved with their Location, so the session follows them from the
+# cache as it does online (several urls, e.g. jepx.org, redirect http to https)
+CACHED_HEADERS = ['Content-Type', 'Content-Range', 'ETag', 'Last-Modified', 'Date', 'Location']
+CONDITIONAL_HEADERS = ['If-None-Match', 'If-Modified-Since']
+
+logger = logging.getLogger(__name__)
+
+def get_request_key(request):
+    """
+    :param request: a requests.PreparedRequest
+    :return: the cache key of the request: the sha256 of its method, url (with
+             the query string), Range header and body. Conditional headers are
+             not part of the key, see get_cached_response.
+    """
+    key = hashlib.sha256()
+    for part in (request.method, request.url, request.headers.get('Range', '')):
+        key.update(part.encode() + b'\n')
+    body = request.body or b''
+    key.update(body.encode() if isinstance(body, str) else body)
+    return key.hexdigest()
+
+def get_body_path(cache_dir, sha256):
+    """
+    :param cache_dir: root folder of the cache
+    :param sha256: hash of a response body
+    :return: path of the stored body
+    """
+    return os.path.join(cache_dir, 'bodies', sha256[:2], sha256)
+
+def get_entry_path(cache_dir, key):
+    """
+    :param cache_dir: root folder of the cache
+    :param key: cache key returned by get_request_key
+    :return: path of the request's entry
+    """
+    return os.path.join(cache_dir, 'requests', key + '.json')
+
+def write_atomic(path, content):
+    """
+    Writes a file through a temporary file, so readers never see it half
+    written. The temporary name is unique per thread, as the archive files
+    are downloaded on thread pools.
+    :param path: path of the file
+    :param content: bytes to write
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = '{}.{}-{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def load_entry(cache_dir, key):
+    """
+    :param cache_dir: root folder of the cache
+    :param key: cache key returned by get_request_key
+    :return: the saved entry, None if the request was never saved or its body is missing
+    """
+    path = get_entry_path(cache_dir, key)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        entry = json.load(f)
+    if not os.path.isfile(get_body_path(cache_dir, entry['sha256'])):
+        return None
+    return entry
+
+def store_response(cache_dir, request, status, headers, content):
+    """
+    Saves a response. The body is written before the entry pointing to it.
+    :param cache_dir: root folder of the cache
+    :param request: the requests.PreparedRequest the response answers
+    :param status: HTTP status code
+    :param headers: response headers; only CACHED_HEADERS are kept
+    :param content: response body (bytes)
+    :return: the saved entry
+    """
+    sha256 = hashlib.sha256(content).hexdigest()
+    body_path = get_body_path(cache_dir, sha256)
+    if not os.path.isfile(body_path):
+        write_atomic(body_path, content)
+    entry = {'url': request.url,
+             'method': request.method,
+             'status': status,
+             'headers': {name: headers[name] for name in CACHED_HEADERS if name in headers},
+             'sha256': sha256,
+             'fetched_at': time.time()}
+    write_atomic(get_entry_path(cache_dir, get_request_key(request)),
+                 json.dumps(entry, indent=1, sort_keys=True).encode())
+    return entry
+
+def is_not_modified(request, entry):
+    """
+    :param request: a requests.PreparedRequest
+    :param entry: the saved entry of the request
+    :return: True if the request's If-None-Match or If-Modified-Since matches
+             the saved validators, i.e. the server would answer 304
+    """
+    headers = entry['headers']
+    etag = request.headers.get('If-None-Match')
+    modified_since = request.headers.get('If-Modified-Since')
+    return ((etag is not None and etag == headers.get('ETag')) or
+            (modified_since is not None and modified_since == headers.get('Last-Modified')))
+
+def get_cached_response(cache_dir, request, entry):
+    """
+    Builds the response to a request from its saved entry. A conditional
+    request whose validators match gets a 304 without a body, as from the
+    server, so incremental downloads behave the same when replayed.
+    :param cache_dir: root folder of the cache
+    :param request: a requests.PreparedRequest
+    :param entry: the saved entry of the request
+    :return: a requests.Response
+    """
+    response = requests.Response()
+    response.headers = CaseInsensitiveDict(entry['headers'])
+    if entry['status'] == 200 and is_not_modified(request, entry):
+        response.status_code = 304
+        response._content = b''
+    else:
+        response.status_code = entry['status']
+        with open(get_body_path(cache_dir, entry['sha256']), 'rb') as f:
+            response._content = f.read()
+    # there is no raw stream behind the body, see Response.close and iter_content
+    response._content_consumed = True
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    return response
+
+class CachingAdapter(HTTPAdapter):
+    """
+    Transport adapter that serves and saves responses in the cache folder,
+    according to the mode, see the top of this file.
+    """
+    def __init__(self, mode, cache_dir=HTTP_CACHE_DIR, max_age=DEFAULT_MAX_AGE):
+        if mode not in MODES:
+            raise ValueError('Unknown cache mode {}'.format(mode))
+        super().__init__()
+        self.mode = mode
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+
+    def send(self, request, **kwargs):
+        key = get_request_key(request)
+        entry = load_entry(self.cache_dir, key) if self.mode != 'record' else None
+        if entry is not None and (self.mode == 'replay' or time.time() - entry['fetched_at'] < self.max_age):
+            return get_cached_response(self.cache_dir, request, entry)
+        if self.mode == 'replay':
+            raise Exception('No recorded response for {}'.format(request.url))
+
+        # the whole response is saved even when the caller only asks if it changed
+        unconditional = request.copy()
+        for name in CONDITIONAL_HEADERS:
+            unconditional.headers.pop(name, None)
+        try:
+            response = super().send(unconditional, **kwargs)
+        except requests.RequestException:
+            if entry is None:
+                raise
+            logger.warning('Serving the stale cached response of %s', request.url)
+            return get_cached_response(self.cache_dir, request, entry)
+        # server errors are not saved, so they are never replayed
+        if response.status_code >= 500:
+            if entry is None:
+                return response
+            logger.warning('Serving the stale cached response of %s (status %d)',
+                           request.url, response.status_code)
+            return get_cached_response(self.cache_dir, request, entry)
+        entry = store_response(self.cache_dir, request, response.status_code,
+                               response.headers, response.content)
+        return get_cached_response(self.cache_dir, request, entry)
+
+# the adapter of the configured mode, None to use the network directly
+ADAPTER = None
+# session used by get()
+DEFAULT_SESSION = requests
+
+def install(session):
+    """
+    Routes a session's requests through the configured cache. Nothing is
+    changed if no mode is configured.
+    :param session: a requests.Session
+    :return: the session
+    """
+    if ADAPTER is not None:
+        session.mount('http://', ADAPTER)
+        session.mount('https://', ADAPTER)
+    return session
+
+def new_session():
+    """
+    :return: a new requests.Session using the configured cache
+    """
+    return install(requests.Session())
+
+def configure(mode=None, cache_dir=HTTP_CACHE_DIR, max_age=DEFAULT_MAX_AGE):
+    """
+    Sets the cache mode of this process. Sessions made before are not changed.
+    :param mode: 'record', 'replay', 'refresh', or None to use the network directly
+    :param cache_dir: root folder of the cache
+    :param max_age: seconds a saved response is served in refresh mode
+    """
+    global ADAPTER, DEFAULT_SESSION
+    ADAPTER = CachingAdapter(mode, cache_dir, max_age) if mode else None
+    DEFAULT_SESSION = new_session() if mode else requests
+
+def get(url, **kwargs):
+    """
+    requests.get through the configured cache.
+    :param url: url to request
+    :param kwargs: keyword arguments of requests.get, e.g. headers
+    :return: a requests.Response
+    """
+    return DEFAULT_SESSION.get(url, **kwargs)
+
+configure(os.environ.get('HTTP_CACHE_MODE') or None,
+          os.environ.get('HTTP_CACHE_DIR', HTTP_CACHE_DIR),
+          float(os.environ.get('HTTP_CACHE_MAX_AGE', DEFAULT_MAX_AGE)))
@@ -0,0 +1,139 @@
+# Parquet output for the archive scrapers. Instead of one uncompressed csv per
+# source file with a different naming scheme for every utility, demand and
+# supply data can be written to a single Parquet dataset partitioned by
+# region, kind (demand or supply) and year:
+#   Japan_Archive_Data/region=Hokuriku/kind=supply/year=2021/part-<name>.parquet
+# Every partition has the same schema, so one region-year can be read without
+# parsing the whole history. Requires pyarrow.
+# The melted supply tables repeat Region, Unit and Fuel_Type on every row, so
+# label columns are stored as categoricals and values as 32-bit numbers, both
+# in the frames the loaders return and in the Parquet files.
+import os
+import pandas as pd
+from data_scrapers.scrape_metrics import measure_stage
+
+ARCHIVE_DIR = 'Japan_Archive_Data'
+COMPRESSION = 'zstd'
+
+DEMAND_COLUMNS = ['Date_Time', 'Region', 'Unit', 'Area_Demand']
+SUPPLY_COLUMNS = ['Date_Time', 'Region', 'Unit', 'Fuel_Type', 'Supply']
+LABEL_COLUMNS = ['Region', 'Unit', 'Fuel_Type']
+# 24 bits of mantissa hold every value the utilities publish (at most one decimal
+# place, well below 1,000,000 MWh) exactly
+VALUE_DTYPE = 'float32'
+
+def to_compact_values(column):
+    """
+    :param column: a pandas Series of values, possibly text with placeholders
+                   such as '－' or '|'
+    :return: an Int32 Series if every value is a whole number, a float32 Series
+             otherwise; placeholders become missing values
+    """
+    column = pd.to_numeric(column, errors='coerce')
+    values = column.dropna()
+    if len(values) and (values % 1 == 0).all() and values.abs().max() < 2 ** 31:
+        return column.astype('Int32')
+    return column.astype(VALUE_DTYPE)
+
+def compact(df, value_column):
+    """
+    Stores the label columns of a demand or supply frame as categoricals and
+    its values as Int32 or float32, see to_compact_values.
+    :param df: demand or supply dataframe from an archive scraper
+    :param value_column: the name of the value column
+    :return: a new dataframe with the same columns
+    """
+    df = df.astype({column: 'category' for column in LABEL_COLUMNS if column in df.columns})
+    df[value_column] = to_compact_values(df[value_column])
+    return df
+
+def to_schema(df, columns, value_column):
+    """
+    Casts a demand or supply frame to the common archive schema: a datetime
+    Date_Time, categorical labels and float32 values (NaN where the source had
+    a placeholder such as '－' or '|'). Values are always float32 so every
+    partition has the same schema.
+    :param df: demand or supply dataframe from an archive scraper
+    :param columns: the columns of the schema, in order
+    :param value_column: the name of the value column
+    :return: a new dataframe with only the schema columns
+    """
+    df = df[columns].astype({column: 'category' for column in LABEL_COLUMNS if column in columns})
+    df['Date_Time'] = pd.to_datetime(df['Date_Time'])
+    df[value_column] = pd.to_numeric(df[value_column], errors='coerce').astype(VALUE_DTYPE)
+    return df
+
+def write_partitions(df, region, kind, name, archive_dir=ARCHIVE_DIR):
+    """
+    Writes a frame to one file per year partition. Writing the same name
+    again replaces the earlier file, so re-running a scraper is idempotent.
+    :param df: dataframe in the archive schema
+    :param region: the region name, e.g. 'Hokuriku'
+    :param kind: 'demand' or 'supply'
+    :param name: name of the source the rows came from, used as the file name
+    :param archive_dir: root folder of the dataset
+    """
+    for year, year_df in df.groupby(df['Date_Time'].dt.year):
+        partition = os.path.join(archive_dir, 'region={}'.format(region),
+                                 'kind={}'.format(kind), 'year={}'.format(year))
+        os.makedirs(partition, exist_ok=True)
+        year_df.to_parquet(os.path.join(partition, 'part-{}.parquet'.format(name)),
+                           index=False, compression=COMPRESSION)
+
+def write_parquet(demand_df, supply_df, region, name, archive_dir=ARCHIVE_DIR):
+    """
+    Writes the demand and supply data of an archive scraper to the
+    partitioned Parquet dataset.
+    :param demand_df: demand dataframe with an Area_Demand column (None if the
+                      source has no demand data)
+    :param supply_df: long-format supply dataframe (None if the source has no
+                      supply data)
+    :param region: the region name
+    :param name: name of the source the rows came from, e.g. the csv file name
+    :param archive_dir: root folder of the dataset
+    """
+    name = os.path.splitext(name)[0]
+    if demand_df is not None:
+        write_partitions(to_schema(demand_df, DEMAND_COLUMNS, 'Area_Demand'),
+                         region, 'demand', name, archive_dir)
+    if supply_df is not None:
+        write_partitions(to_schema(supply_df, SUPPLY_COLUMNS, 'Supply'),
+                         region, 'supply', name, archive_dir)
+
+def write_archive(demand_df, supply_df, region, output_format='csv', archive_dir=ARCHIVE_DIR):
+    """
+    Common output of the archive loaders: Japan_<Region>_Demand_Data.csv and
+    Japan_<Region>_Supply_Data.csv, or the partitioned Parquet dataset.
+    :param demand_df: demand dataframe with an Area_Demand column
+    :param supply_df: long-format supply dataframe (None if the source has no
+                      supply data)
+    :param region: the region name
+    :param output_format: 'csv' or 'parquet'
+    :param archive_dir: root folder of the Parquet dataset
+    :return: number of rows written
+    """
+    with measure_stage('archive', region, 'write') as counts:
+        if output_format == 'parquet':
+            write_parquet(demand_df, supply_df, region, 'Japan_{}_Data'.format(region), archive_dir)
+        else:
+            demand_df.to_csv('Japan_{}_Demand_Data.csv'.format(region), index=False)
+            if supply_df is not None:
+                supply_df.to_csv('Japan_{}_Supply_Data.csv'.format(region), index=False)
+        counts['rows'] = len(demand_df) + (len(supply_df) if supply_df is not None else 0)
+    return counts['rows']
+
+def read_parquet(region, kind, year=None, archive_dir=ARCHIVE_DIR):
+    """
+    Reads one region's demand or supply data back from the dataset.
+    :param region: the region name
+    :param kind: 'demand' or 'supply'
+    :param year: only read this year's partition, None for every year
+    :param archive_dir: root folder of the dataset
+    :return: dataframe in the archive schema
+    """
+    path = os.path.join(archive_dir, 'region={}'.format(region), 'kind={}'.format(kind))
+    if year is not None:
+        path = os.path.join(path, 'year={}'.format(year))
+    df = pd.read_parquet(path)
+    # partition keys below the read path come back as extra columns
+    return df.drop(columns=[c for c in ('year',) if c in df.columns])
@@ -0,0 +1,186 @@
+# Incremental download of the archive files published by the utilities.
+# Every source keeps a manifest (Japan_Archive_Files/<source>/manifest.json)
+# recording each file's url, size, Last-Modified, ETag and content hash, and a
+# local copy of the file. A sync sends the saved validators back, so only new
+# or changed files are transferred, and the manifest is saved after every file
+# so an interrupted run resumes where it stopped. A failing url is reported and
+# skipped instead of aborting the whole run. Files are downloaded on a bounded
+# thread pool with a limit per host, and can be parsed in the same worker as
+# soon as they arrive. The download and parse of every file are recorded as
+# fetch and parse stages in scrape_metrics.
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from data_scrapers import http_cache
+from data_scrapers.scrape_metrics import measure_stage
+
+FILES_DIR = 'Japan_Archive_Files'
+DEFAULT_WORKERS = 8
+# concurrent requests to the same utility host
+PER_HOST_LIMIT = 4
+
+# data: the result of the parse function, None if no parse function was given
+SyncedFile = namedtuple('SyncedFile', ['url', 'path', 'changed', 'data'])
+
+logger = logging.getLogger(__name__)
+
+def get_source_dir(source, files_dir=FILES_DIR):
+    """
+    :param source: name of the source, e.g. 'hokuriku'
+    :param files_dir: root folder of the local copies
+    :return: folder holding the local copies and manifest of the source
+    """
+    return os.path.join(files_dir, source)
+
+def load_manifest(source_dir):
+    """
+    :param source_dir: folder of the source
+    :return: dictionary of url -> file entry, empty if the source was never synced
+    """
+    manifest_file = os.path.join(source_dir, 'manifest.json')
+    if not os.path.isfile(manifest_file):
+        return {}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+def save_manifest(source_dir, manifest):
+    """
+    Saves the manifest atomically so an interrupted run never leaves it half written.
+    :param source_dir: folder of the source
+    :param manifest: dictionary of url -> file entry
+    """
+    manifest_file = os.path.join(source_dir, 'manifest.json')
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+def get_local_path(source_dir, url):
+    """
+    :param source_dir: folder of the source
+    :param url: url of the archive file
+    :return: path of the local copy, named after the last part of the url
+    """
+    return os.path.join(source_dir, os.path.basename(urlparse(url).path))
+
+def sync_file(session, url, entry, path, headers=None, counts=None):
+    """
+    Downloads one file unless the server reports it unchanged.
+    :param session: http_cache module or a requests.Session
+    :param url: url of the archive file
+    :param entry: the file's manifest entry from the last sync (None if new)
+    :param path: path of the local copy
+    :param headers: extra request headers, e.g. a User-Agent
+    :param counts: optional stage counts of scrape_metrics.measure_stage, set
+                   to the status and size of the response
+    :return: a tuple (entry, changed); entry is {'missing': True} if the file
+             does not exist (404)
+    """
+    headers = dict(headers or {})
+    if entry and not entry.get('missing') and os.path.isfile(path):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    r = session.get(url, headers=headers)
+    if counts is not None:
+        counts.update(status=r.status_code, bytes=len(r.content))
+    if r.status_code == 304:
+        return entry, False
+    if r.status_code == 404:
+        return {'missing': True}, False
+    if r.status_code != 200:
+        raise Exception('Failed to load page {}'.format(url))
+
+    new_entry = {'path': path,
+                 'size': len(r.content),
+                 'last_modified': r.headers.get('Last-Modified'),
+                 'etag': r.headers.get('ETag'),
+                 'sha256': hashlib.sha256(r.content).hexdigest()}
+    changed = (not entry or entry.get('missing') or entry.get('sha256') != new_entry['sha256']
+               or not os.path.isfile(path))
+    if changed:
+        with open(path + '.tmp', 'wb') as f:
+            f.write(r.content)
+        os.replace(path + '.tmp', path)
+    return new_entry, changed
+
+def is_available(entry):
+    """
+    :param entry: a manifest entry, or None
+    :return: True if the entry points to a local copy that exists
+    """
+    return bool(entry) and not entry.get('missing') and os.path.isfile(entry['path'])
+
+def sync_files(source, urls, session=http_cache, headers=None, parse=None, probe=None,
+               workers=DEFAULT_WORKERS, per_host=PER_HOST_LIMIT, files_dir=FILES_DIR, metrics=None):
+    """
+    Brings the local copies of a source's archive files up to date,
+    downloading up to `workers` files at a time and at most `per_host` from
+    the same host. Urls that return 404 are recorded in the manifest as
+    missing; other failures are logged and skipped, keeping any local copy.
+    :param source: name of the source, e.g. 'hokuriku'
+    :param urls: list of archive file urls
+    :param session: http_cache module or a requests.Session
+    :param headers: extra request headers, e.g. a User-Agent
+    :param parse: optional function called with the local path of each file,
+                  in the worker, as soon as the file is synced
+    :param probe: optional set of urls to request; other urls already in the
+                  manifest (found or missing) are used as recorded without a
+                  request, so only files that can still change are checked
+    :param workers: maximum number of files downloaded at the same time
+    :param per_host: maximum number of concurrent requests to one host
+    :param files_dir: root folder of the local copies
+    :param metrics: (scraper, source) the stages are recorded under in
+                    scrape_metrics, e.g. ('archive', 'Tohoku'); defaults to
+                    ('archive', source)
+    :return: a list of SyncedFile for every file available locally, in the order of urls
+    """
+    source_dir = get_source_dir(source, files_dir)
+    os.makedirs(source_dir, exist_ok=True)
+    manifest = load_manifest(source_dir)
+    manifest_lock = threading.Lock()
+    host_limits = {urlparse(url).netloc: threading.Semaphore(per_host) for url in urls}
+    failed = []
+    metrics = metrics or ('archive', source)
+
+    def sync_one(url):
+        path = get_local_path(source_dir, url)
+        with manifest_lock:
+            previous = manifest.get(url)
+        known = previous and (previous.get('missing') or is_available(previous))
+        if probe is not None and url not in probe and known:
+            entry, changed = previous, False
+        else:
+            try:
+                with host_limits[urlparse(url).netloc]:
+                    with measure_stage(*metrics, 'fetch') as counts:
+                        entry, changed = sync_file(session, url, previous, path, headers, counts)
+            except Exception:
+                logger.exception('%s: failed to sync %s', source, url)
+                failed.append(url)
+                entry, changed = previous, False
+            if entry and entry != previous:
+                with manifest_lock:
+                    manifest[url] = entry
+                    save_manifest(source_dir, manifest)
+        if not is_available(entry):
+            return None
+        data = None
+        if parse:
+            with measure_stage(*metrics, 'parse') as counts:
+                data = parse(entry['path'])
+                counts.update(bytes=os.path.getsize(entry['path']), rows=len(data))
+        return SyncedFile(url, entry['path'], changed, data)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        synced = [f for f in executor.map(sync_one, urls) if f is not None]
+
+    if failed:
+        logger.warning('%s: %d of %d files could not be synced', source, len(failed), len(urls))
+    return synced
@@ -0,0 +1,191 @@
+# Hourly carbon intensity of every region's supply mix. Emission factors are
+# given per fuel type of the national dataset in gCO2/kWh; thermal power is
+# split into coal, LNG and oil with a national sub-mix that each region can
+# override, since the utilities only publish one thermal figure. For every
+# region the hourly supply table is turned into one matrix (hours x fuel types)
+# and multiplied by the region's factor vector, giving the generation (MWh),
+# emissions (tCO2) and intensity (gCO2/kWh) of every hour. The national series
+# is the sum of the regions with supply data: Tokyo only publishes demand, so
+# it is not part of it (the regions left out are logged). Results are cached per
+# region under a key made of the factor set version, the region's resolved
+# factors and a fingerprint of its supply data (columns, row count, first and
+# last hour, and the modification time of the national supply file), so
+# changing one region's thermal mix only recomputes that region. Older results
+# of a region are removed when it is recomputed.
+# Run from the root of the repository, after national_dataset.py:
+#   python -m data_scrapers.japan_archive.carbon_intensity
+import hashlib
+import json
+import logging
+import os
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from data_scrapers.japan_archive.archive_output import COMPRESSION
+from data_scrapers.japan_archive.national_dataset import NATIONAL_DIR, read_national_dataset
+
+# version: label of the factor set, stored with the results
+# fuel_factors: fuel type -> gCO2/kWh; fuel types not listed (curtailment,
+#               pumped storage and interconnector flows, which move energy
+#               generated elsewhere) are left out of generation and emissions
+# thermal_factors: thermal fuel -> gCO2/kWh
+# thermal_mix: thermal fuel -> share of thermal generation
+# region_thermal_mix: region -> thermal_mix used instead of the national one
+FactorSet = namedtuple('FactorSet', ['version', 'fuel_factors', 'thermal_factors',
+                                     'thermal_mix', 'region_thermal_mix'])
+
+# Direct combustion factors; the thermal shares are rough estimates of each
+# utility's fleet and should be replaced with a FactorSet of your own sources.
+DEFAULT_FACTORS = FactorSet(
+    version='default-1',
+    fuel_factors={'Nuclear': 0, 'Hydro': 0, 'Geothermal': 0, 'Biomass': 0, 'Solar': 0, 'Wind': 0},
+    thermal_factors={'Coal': 864, 'LNG': 476, 'Oil': 695},
+    thermal_mix={'Coal': 0.4, 'LNG': 0.5, 'Oil': 0.1},
+    region_thermal_mix={
+        'Hokkaido': {'Coal': 0.7, 'LNG': 0.15, 'Oil': 0.15},
+        'Tohoku': {'Coal': 0.55, 'LNG': 0.4, 'Oil': 0.05},
+        'Tokyo': {'Coal': 0.2, 'LNG': 0.75, 'Oil': 0.05},
+        'Hokuriku': {'Coal': 0.85, 'LNG': 0.1, 'Oil': 0.05},
+        'Chubu': {'Coal': 0.3, 'LNG': 0.65, 'Oil': 0.05},
+        'Kansai': {'Coal': 0.25, 'LNG': 0.65, 'Oil': 0.1},
+        'Chugoku': {'Coal': 0.75, 'LNG': 0.15, 'Oil': 0.1},
+        'Shikoku': {'Coal': 0.7, 'LNG': 0.2, 'Oil': 0.1},
+        'Kyushu': {'Coal': 0.5, 'LNG': 0.4, 'Oil': 0.1},
+    })
+
+CACHE_DIR = 'Japan_Emissions_Cache'
+INTENSITY_COLUMNS = ['Generation', 'Emissions', 'Intensity']
+
+logger = logging.getLogger(__name__)
+
+def get_region_factors(factor_set, region):
+    """
+    :param factor_set: a FactorSet
+    :param region: the region name
+    :return: dict of fuel type -> gCO2/kWh for the region, Thermal included
+    """
+    mix = factor_set.region_thermal_mix.get(region, factor_set.thermal_mix)
+    total = sum(mix.values())
+    factors = dict(factor_set.fuel_factors)
+    factors['Thermal'] = sum(factor_set.thermal_factors[fuel] * share / total for fuel, share in mix.items())
+    return factors
+
+def get_supply_fingerprint(national_dir=NATIONAL_DIR):
+    """
+    :param national_dir: folder of the national tables
+    :return: modification time of the national supply file, which changes
+             whenever national_dataset.py rewrites it
+    """
+    return os.stat(os.path.join(national_dir, 'supply.parquet')).st_mtime_ns
+
+def get_cache_key(factor_set, factors, wide_df, fingerprint=None):
+    """
+    Hashing every supply value would cost about as much as the product being
+    cached, so the supply data is identified by its columns, row count, first
+    and last hour, and the caller's fingerprint of where it was read from.
+    :param factor_set: the FactorSet applied
+    :param factors: the region's resolved factors from get_region_factors
+    :param wide_df: the region's hourly supply indexed by Date_Time, one column per fuel type
+    :param fingerprint: identifies the version of the supply data, e.g. get_supply_fingerprint()
+    :return: hex digest that changes with the factor set version, a factor or the supply data
+    """
+    supply = [list(map(str, wide_df.columns)), len(wide_df), fingerprint]
+    if len(wide_df):
+        supply += [str(wide_df.index[0]), str(wide_df.index[-1])]
+    digest = hashlib.sha256(json.dumps([factor_set.version, factors, supply], sort_keys=True).encode())
+    return digest.hexdigest()[:32]
+
+def prune_cache(cache_dir, region, keep):
+    """
+    Removes the cached results of a region other than the current one.
+    :param cache_dir: folder of the per-region results
+    :param region: the region name
+    :param keep: file name of the region's current results
+    """
+    for name in os.listdir(cache_dir):
+        if name.startswith(region + '-') and name.endswith('.parquet') and name != keep:
+            os.remove(os.path.join(cache_dir, name))
+
+def compute_region_intensity(wide_df, factors):
+    """
+    :param wide_df: a region's hourly supply in MWh, indexed by Date_Time with
+                    one column per fuel type
+    :param factors: dict of fuel type -> gCO2/kWh
+    :return: dataframe indexed by Date_Time with the Generation (MWh),
+             Emissions (tCO2) and Intensity (gCO2/kWh) of every hour
+    """
+    fuels = [fuel for fuel in wide_df.columns if fuel in factors]
+    supply = wide_df[fuels].to_numpy(dtype='float64', na_value=np.nan)
+    # negative values are not generation; missing fuels count as zero
+    supply = np.nan_to_num(np.clip(supply, 0, None))
+    generation = supply.sum(axis=1)
+    # MWh x gCO2/kWh = kgCO2
+    emissions = supply @ np.array([factors[fuel] for fuel in fuels], dtype='float64') / 1000
+    with np.errstate(divide='ignore', invalid='ignore'):
+        intensity = np.where(generation > 0, emissions * 1000 / generation, np.nan)
+    return pd.DataFrame({'Generation': generation, 'Emissions': emissions, 'Intensity': intensity},
+                        index=wide_df.index)
+
+def compute_intensity(supply_df, factor_set=DEFAULT_FACTORS, cache_dir=CACHE_DIR, fingerprint=None):
+    """
+    Computes the hourly intensity of every region in the national supply
+    table and of the whole country. The national series only covers the
+    regions with supply data; factor set regions without any (Tokyo) are
+    logged as left out.
+    :param supply_df: national supply dataframe indexed by (Date_Time, Region,
+                      Fuel_Type), see national_dataset.build_national_dataset
+    :param factor_set: the FactorSet to apply
+    :param cache_dir: folder of the per-region results, None to disable caching
+    :param fingerprint: identifies the version of supply_df for the cache, e.g.
+                        get_supply_fingerprint(); without it, a revised value
+                        that keeps a region's row count and hours is not noticed
+    :return: a tuple (regional_df, national_df); regional_df is indexed by
+             (Date_Time, Region) and national_df by Date_Time, both with the
+             columns Generation, Emissions and Intensity
+    """
+    wide = supply_df['Supply'].unstack('Fuel_Type')
+    missing = sorted(set(factor_set.region_thermal_mix) - set(wide.index.unique('Region')))
+    if missing:
+        logger.warning('No supply data for %s; left out of the national intensity', ', '.join(missing))
+    regions = []
+    for region, wide_df in wide.groupby(level='Region', observed=True):
+        wide_df = wide_df.droplevel('Region')
+        factors = get_region_factors(factor_set, region)
+        cache_file = None
+        if cache_dir is not None:
+            cache_name = '{}-{}.parquet'.format(region, get_cache_key(factor_set, factors, wide_df, fingerprint))
+            cache_file = os.path.join(cache_dir, cache_name)
+        if cache_file and os.path.isfile(cache_file):
+            region_df = pd.read_parquet(cache_file)
+        else:
+            region_df = compute_region_intensity(wide_df, factors)
+            if cache_file:
+                os.makedirs(cache_dir, exist_ok=True)
+                region_df.to_parquet(cache_file + '.tmp', compression=COMPRESSION)
+                os.replace(cache_file + '.tmp', cache_file)
+                prune_cache(cache_dir, region, cache_name)
+        regions.append(region_df.assign(Region=region))
+
+    regional_df = pd.concat(regions).set_index('Region', append=True).sort_index()
+    national_df = regional_df[['Generation', 'Emissions']].groupby(level='Date_Time').sum()
+    national_df['Intensity'] = (national_df['Emissions'] * 1000 / national_df['Generation']).where(
+        national_df['Generation'] > 0)
+    return regional_df[INTENSITY_COLUMNS], national_df
+
+def write_intensity(regional_df, national_df, factor_set=DEFAULT_FACTORS, national_dir=NATIONAL_DIR):
+    """
+    Writes the intensity series next to the national dataset, one file per factor set version.
+    :param regional_df: regional intensity from compute_intensity
+    :param national_df: national intensity from compute_intensity
+    :param factor_set: the FactorSet the series were computed with
+    :param national_dir: folder of the national tables
+    """
+    os.makedirs(national_dir, exist_ok=True)
+    regional_df.to_parquet(os.path.join(national_dir, 'intensity-regional-{}.parquet'.format(factor_set.version)),
+                           compression=COMPRESSION)
+    national_df.to_parquet(os.path.join(national_dir, 'intensity-national-{}.parquet'.format(factor_set.version)),
+                           compression=COMPRESSION)
+
+if __name__ == '__main__':
+    demand_df, supply_df = read_national_dataset()
+    write_intensity(*compute_intensity(supply_df, fingerprint=get_supply_fingerprint()))
@@ -0,0 +1,170 @@
+# National demand and supply tables built from the regional archive loaders.
+# Every utility names its fuel types differently ('Nuclear Power' vs 'Nuclear',
+# 'Solar(Actual)' vs 'Solar Performance' vs 'Solar Power' vs 'Solar', ...) and
+# Tokyo calls its demand column 'Demand'. This maps every region onto the
+# archive schema and one fuel vocabulary, and combines the regions into a
+# single table sorted and indexed by (Date_Time, Region, Fuel_Type), so a
+# cross-region query is one index lookup, e.g.
+#   supply.loc[pd.IndexSlice['2021-08-01':'2021-08-31', :, 'Solar'], :]
+# Run from the root of the repository:
+#   python -m data_scrapers.japan_archive.national_dataset [--parquet]
+import importlib
+import os
+import sys
+import pandas as pd
+from data_scrapers.japan_archive.archive_output import (COMPRESSION, DEMAND_COLUMNS, LABEL_COLUMNS,
+                                                        SUPPLY_COLUMNS, read_parquet, to_schema)
+
+# region name -> (module, function returning (demand_df, supply_df) or a demand df)
+ARCHIVE_LOADERS = {
+    'Hokkaido': ('data_scrapers.japan_hokkaido.japan_hokkaido', 'read_hokkaido_csv'),
+    'Tohoku': ('data_scrapers.japan_tohoku.japan_tohoku', 'read_tohoku_data'),
+    'Tokyo': ('data_scrapers.japan_tokyo.japan_tokyo', 'read_tokyo_data'),
+    'Hokuriku': ('data_scrapers.japan_hokuriku.japan_hokuriku', 'read_hokuriku_data'),
+    'Chubu': ('data_scrapers.japan_chubu.japan_chubu', 'read_chubu_csv'),
+    'Kansai': ('data_scrapers.japan_kansai.japan_kansai', 'read_kansai_csv'),
+    'Chugoku': ('data_scrapers.japan_chugoku.japan_chugoku', 'read_chugoku_data'),
+    'Shikoku': ('data_scrapers.japan_shikoku.japan_shikoku', 'read_shikoku_data'),
+    'Kyushu': ('data_scrapers.japan_kyushu.japan_kyushu', 'read_kyushu_data'),
+}
+
+# fuel type of a regional loader -> fuel type of the national table
+FUEL_TYPES = {
+    'Nuclear Power': 'Nuclear',
+    'Nuclear': 'Nuclear',
+    'Thermal Power': 'Thermal',
+    'Thermal': 'Thermal',
+    'Hydropower': 'Hydro',
+    'Hydraulic': 'Hydro',
+    'Geothermal': 'Geothermal',
+    'Biomass': 'Biomass',
+    'Solar Power': 'Solar',
+    'Solar Performance': 'Solar',
+    'Solar performance': 'Solar',
+    'Solar(Actual)': 'Solar',
+    'Solar': 'Solar',
+    'Solar Power Suppression': 'Solar Curtailment',
+    'Solar Power Supression': 'Solar Curtailment',
+    'Solar Supression Amount': 'Solar Curtailment',
+    'Solar(Output_Control)': 'Solar Curtailment',
+    'Wind Power': 'Wind',
+    'Wind Performance': 'Wind',
+    'Wind(Actual)': 'Wind',
+    'Wind Power Suppression': 'Wind Curtailment',
+    'Wind Suppression Amount': 'Wind Curtailment',
+    'Wind(Output_Control)': 'Wind Curtailment',
+    'Pumped Storage': 'Pumped Storage',
+    'Pumped storage': 'Pumped Storage',
+    'Pumped_Hydro': 'Pumped Storage',
+    'Interconnector': 'Interconnector',
+}
+
+# Tokyo publishes hourly average demand in MW, which is the energy of the hour in MWh
+UNITS = {'MW': 'MWh', 'MWh': 'MWh'}
+# MWh per value of each region's loader output. The Tohoku, Tokyo, Hokuriku,
+# Chugoku and Shikoku loaders convert their files' 10 MWh units themselves and
+# Hokkaido publishes MWh; Chubu's files are in 万kWh (10 MWh), which its loader
+# only labels MWh. Kansai's and Kyushu's files carry no unit line, so their
+# values are taken as the MWh their loaders label them.
+TO_MWH = {'Hokkaido': 1, 'Tohoku': 1, 'Tokyo': 1, 'Hokuriku': 1, 'Chubu': 10,
+          'Kansai': 1, 'Chugoku': 1, 'Shikoku': 1, 'Kyushu': 1}
+
+NATIONAL_DIR = 'Japan_National_Data'
+
+def load_region(region, from_parquet=False):
+    """
+    :param region: the region name, a key of ARCHIVE_LOADERS
+    :param from_parquet: read the region from the partitioned Parquet dataset
+                         written with --parquet instead of running its loader
+    :return: a tuple (demand_df, supply_df); supply_df is None for Tokyo
+    """
+    if from_parquet:
+        supply_df = read_parquet(region, 'supply') if region != 'Tokyo' else None
+        return read_parquet(region, 'demand'), supply_df
+    module, function = ARCHIVE_LOADERS[region]
+    data = getattr(importlib.import_module(module), function)()
+    if isinstance(data, pd.DataFrame):
+        return data.rename(columns={'Demand': 'Area_Demand'}), None
+    return data
+
+def normalize_demand(demand_df, region):
+    """
+    :param demand_df: demand dataframe of a regional loader
+    :param region: the region name
+    :return: demand dataframe in the archive schema, values in MWh (see TO_MWH)
+    """
+    demand_df = to_schema(demand_df.rename(columns={'Demand': 'Area_Demand'}), DEMAND_COLUMNS, 'Area_Demand')
+    demand_df['Area_Demand'] *= TO_MWH[region]
+    demand_df['Region'] = region
+    demand_df['Unit'] = demand_df['Unit'].map(UNITS)
+    return demand_df.dropna(subset=['Date_Time'])
+
+def normalize_supply(supply_df, region):
+    """
+    :param supply_df: long-format supply dataframe of a regional loader
+    :param region: the region name
+    :return: supply dataframe in the archive schema with national fuel types, values in MWh
+    """
+    unknown = set(supply_df['Fuel_Type']) - set(FUEL_TYPES)
+    if unknown:
+        raise ValueError('{}: unknown fuel types {}'.format(region, sorted(unknown)))
+    supply_df = to_schema(supply_df, SUPPLY_COLUMNS, 'Supply')
+    supply_df['Supply'] *= TO_MWH[region]
+    supply_df['Region'] = region
+    supply_df['Unit'] = supply_df['Unit'].map(UNITS)
+    supply_df['Fuel_Type'] = supply_df['Fuel_Type'].map(FUEL_TYPES)
+    return supply_df.dropna(subset=['Date_Time'])
+
+def to_categories(df):
+    """
+    Concatenating regions with different categories falls back to strings,
+    so the combined frame's label columns are made categorical again.
+    :param df: combined demand or supply dataframe
+    :return: dataframe with categorical label columns
+    """
+    return df.astype({column: 'category' for column in LABEL_COLUMNS if column in df.columns})
+
+def build_national_dataset(regions=None, from_parquet=False):
+    """
+    Combines the demand and supply data of every region. Rows the utilities
+    published more than once (overlapping files) keep the last value read.
+    :param regions: list of region names, defaults to every region in ARCHIVE_LOADERS
+    :param from_parquet: read the regions from the partitioned Parquet dataset
+    :return: a tuple (demand_df, supply_df); demand_df is indexed by
+             (Date_Time, Region) and supply_df by (Date_Time, Region, Fuel_Type),
+             both sorted in ascending order
+    """
+    demand, supply = [], []
+    for region in regions or list(ARCHIVE_LOADERS):
+        demand_df, supply_df = load_region(region, from_parquet)
+        demand.append(normalize_demand(demand_df, region))
+        if supply_df is not None:
+            supply.append(normalize_supply(supply_df, region))
+
+    demand_df = to_categories(pd.concat(demand, ignore_index=True)).set_index(['Date_Time', 'Region'])
+    demand_df = demand_df[~demand_df.index.duplicated(keep='last')].sort_index()
+    supply_df = to_categories(pd.concat(supply, ignore_index=True)).set_index(['Date_Time', 'Region', 'Fuel_Type'])
+    supply_df = supply_df[~supply_df.index.duplicated(keep='last')].sort_index()
+    return demand_df, supply_df
+
+def write_national_dataset(demand_df, supply_df, national_dir=NATIONAL_DIR):
+    """
+    Writes the national tables to one Parquet file each, keeping their sort order.
+    :param demand_df: national demand dataframe from build_national_dataset
+    :param supply_df: national supply dataframe from build_national_dataset
+    :param national_dir: folder of the national tables
+    """
+    os.makedirs(national_dir, exist_ok=True)
+    demand_df.to_parquet(os.path.join(national_dir, 'demand.parquet'), compression=COMPRESSION)
+    supply_df.to_parquet(os.path.join(national_dir, 'supply.parquet'), compression=COMPRESSION)
+
+def read_national_dataset(national_dir=NATIONAL_DIR):
+    """
+    :param national_dir: folder of the national tables
+    :return: a tuple (demand_df, supply_df) indexed as by build_national_dataset
+    """
+    return (pd.read_parquet(os.path.join(national_dir, 'demand.parquet')),
+            pd.read_parquet(os.path.join(national_dir, 'supply.parquet')))
+
+if __name__ == '__main__':
+    write_national_dataset(*build_national_dataset(from_parquet='--parquet' in sys.argv[1:]))
@@ -0,0 +1,89 @@
+# Wide supply tables for the archive loaders. The loaders used to melt every
+# region's supply data to long form and then sort the melted table (twelve
+# times the number of hours) by Date_Time and Fuel_Type, only to put the most
+# recent data first. Here the supply data stays wide (one column per fuel type)
+# with a chronological Date_Time index, which the source files already follow,
+# so ordering it costs a monotonicity check instead of a sort. Newest-first
+# data is a reversed view of it, and the long form is built from that view
+# with array operations, all at once (melt_supply) or in chunks when a
+# consumer asks for them (iter_supply).
+import numpy as np
+import pandas as pd
+from data_scrapers.japan_archive.archive_output import to_compact_values
+
+ID_COLUMNS = ['Region', 'Unit']
+# hours of wide rows per chunk yielded by iter_supply
+CHUNK_ROWS = 24 * 31
+
+def to_wide_supply(data):
+    """
+    :param data: cleaned dataframe of a loader with a Date_Time column, the
+                 Region and Unit columns and one column per fuel type
+    :return: dataframe indexed by Date_Time in chronological order with
+             categorical Region and Unit columns and one Int32 or float32
+             column per fuel type
+    """
+    data = data.set_index('Date_Time')
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index(kind='stable')
+    fuels = [column for column in data.columns if column not in ID_COLUMNS]
+    data = data.astype({column: 'category' for column in ID_COLUMNS})
+    data[fuels] = data[fuels].apply(to_compact_values)
+    return data
+
+def order_newest_first(df):
+    """
+    :param df: dataframe with a Date_Time column or index
+    :return: the rows with the most recent data first, a reversed view if the
+             rows are already chronological
+    """
+    date_time = df.index if 'Date_Time' not in df.columns else df['Date_Time']
+    if date_time.is_monotonic_increasing:
+        return df.iloc[::-1]
+    return df.sort_values(by='Date_Time', ascending=False, kind='stable')
+
+def repeat_labels(column, times):
+    """
+    :param column: a label column of the wide table
+    :param times: number of times each row is repeated
+    :return: categorical with every row repeated, without copying the strings
+    """
+    column = column.astype('category')
+    return pd.Categorical.from_codes(np.repeat(column.cat.codes.to_numpy(), times),
+                                     column.cat.categories)
+
+def melt_supply(wide_df, newest_first=True):
+    """
+    Builds the long-format supply table in the order the loaders produced by
+    sorting on Date_Time and Fuel_Type, without sorting.
+    :param wide_df: wide supply dataframe from to_wide_supply
+    :param newest_first: most recent data (and fuel types in descending order)
+                         first, as in the csv files; chronological otherwise
+    :return: dataframe with the columns Date_Time, Region, Unit, Fuel_Type, Supply
+    """
+    fuels = sorted(column for column in wide_df.columns if column not in ID_COLUMNS)
+    rows = wide_df.iloc[::-1] if newest_first else wide_df
+    codes = np.arange(len(fuels))[::-1] if newest_first else np.arange(len(fuels))
+    values = rows[[fuels[code] for code in codes]].apply(pd.to_numeric, errors='coerce')
+    values = values.to_numpy(dtype='float64', na_value=np.nan)
+    return pd.DataFrame({
+        'Date_Time': np.repeat(rows.index.to_numpy(), len(fuels)),
+        'Region': repeat_labels(rows['Region'], len(fuels)),
+        'Unit': repeat_labels(rows['Unit'], len(fuels)),
+        'Fuel_Type': pd.Categorical.from_codes(np.tile(codes, len(rows)), fuels),
+        'Supply': to_compact_values(pd.Series(values.ravel())),
+    })
+
+def iter_supply(wide_df, newest_first=True, chunk_rows=CHUNK_ROWS):
+    """
+    Yields the long-format supply table lazily, in the same order as melt_supply.
+    :param wide_df: wide supply dataframe from to_wide_supply
+    :param newest_first: most recent data first
+    :param chunk_rows: number of wide rows melted per chunk
+    :return: a generator of long-format dataframes
+    """
+    starts = range(0, len(wide_df), chunk_rows)
+    if newest_first:
+        starts = reversed(starts)
+    for start in starts:
+        yield melt_supply(wide_df.iloc[start:start + chunk_rows], newest_first)
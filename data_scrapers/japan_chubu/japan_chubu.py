@@ -6,46 +6,73 @@
 # is from April through March. Chubu Electric Power serves the Chubu region, which is located in
 # the middle of Honshu Island, the main island of Japan. 
 
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from functools import partial
+from data_scrapers.japan_archive.archive_output import compact, write_archive
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
 
-def read_chubu_csv():
-    combined_data = pd.DataFrame()
-    for year in range(2016, datetime.now().year + 1):
-        csv = pd.read_csv('https://powergrid.chuden.co.jp/denki_yoho_content_data/' +
-                          str(year) + '_areabalance_current_term.csv', header = 4,
-                          encoding = 'shift_jis')
-        combined_data = combined_data.append(csv, ignore_index=True)
-    # Translate Japanese column names to English
-    combined_data.columns = ['Date', 'Time', 'Area_Demand', 'Nuclear', 'Thermal',
-                          'Hydraulic', 'Geothermal', 'Biomass', 'Solar(Actual)',
-                          'Solar(Output_Control)', 'Wind(Actual)', 'Wind(Output_Control)',
-                          'Pumped_Hydro', 'Interconnector']
-
-    # assign units and region
-    combined_data['Region'] = 'Chubu'
-    combined_data['Unit'] = 'MWh'
-
-    # combine columns 'DATE' and 'TIME' to make a datetime object
-    combined_data['Date']=pd.to_datetime(combined_data['Date'] + ' ' + combined_data['Time'], format='%Y/%m/%d %H:%M')
-    combined_data.drop('Time', axis=1, inplace=True)
-    combined_data.rename(columns={"Date": "Date_Time"}, inplace=True)
-
-    # get demand data into one df
-    demand_df = combined_data[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-    demand_df.sort_values(by=['Date_Time'],ascending=False, inplace=True)
-
-    # get supply data into another df
-    supply_df = combined_data
-    supply_df.drop('Area_Demand', axis=1, inplace=True)
-    # Pivot "wide" to "long" format
-    supply_df = pd.melt(combined_data, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-    supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
+COLUMNS = ['Date', 'Time', 'Area_Demand', 'Nuclear', 'Thermal',
+           'Hydraulic', 'Geothermal', 'Biomass', 'Solar(Actual)',
+           'Solar(Output_Control)', 'Wind(Actual)', 'Wind(Output_Control)',
+           'Pumped_Hydro', 'Interconnector']
 
+def read_chubu_chunks():
+    """
+    Yields each year's CSV with its Japanese column names translated to English.
+    """
+    urls = ['https://powergrid.chuden.co.jp/denki_yoho_content_data/' + str(year) +
+            '_areabalance_current_term.csv' for year in range(2016, datetime.now().year + 1)]
+    # only new or changed years are downloaded, the others are read from the local copies
+    read_csv = partial(pd.read_csv, header = 4, encoding = 'shift_jis')
+    for url, path, changed, csv in sync_files('chubu', urls, parse=read_csv,
+                                              metrics=('archive', 'Chubu')):
+        csv.columns = COLUMNS
+        yield csv
+
+def read_chubu_csv(wide=False):
+    """
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df), most recent data first
+    """
+    # Combine multi-year CSVs into one dataframe with a single concat
+    combined_data = pd.concat(read_chubu_chunks(), ignore_index=True)
+
+    with measure_stage('archive', 'Chubu', 'transform') as counts:
+        # assign units and region
+        combined_data['Region'] = 'Chubu'
+        combined_data['Unit'] = 'MWh'
+
+        # combine columns 'DATE' and 'TIME' to make a datetime object
+        combined_data['Date']=pd.to_datetime(combined_data['Date'] + ' ' + combined_data['Time'], format='%Y/%m/%d %H:%M')
+        combined_data.drop('Time', axis=1, inplace=True)
+        combined_data.rename(columns={"Date": "Date_Time"}, inplace=True)
+
+        # get demand data into one df
+        demand_df = order_newest_first(combined_data[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
+
+        # get supply data into another df, one column per fuel type
+        supply_df = to_wide_supply(combined_data.drop('Area_Demand', axis=1))
+        if not wide:
+            # Pivot "wide" to "long" format
+            supply_df = melt_supply(supply_df)
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
     return demand_df, supply_df
 
+def download_csv(output_format='csv'):
+    """
+    Writes the demand and supply data to csv files or the Parquet dataset.
+    :param output_format: 'csv' for Japan_Chubu_Demand_Data.csv and
+                          Japan_Chubu_Supply_Data.csv, 'parquet' for the dataset
+    """
+    demand_df, supply_df = read_chubu_csv()
+    write_archive(demand_df, supply_df, 'Chubu', output_format)
+
 if __name__ == '__main__':
-    chubu_data = read_chubu_csv()
-    chubu_data[0] # demand data
-    chubu_data[1] # supply data
\ No newline at end of file
+    download_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv')
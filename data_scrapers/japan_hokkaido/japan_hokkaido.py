@@ -6,57 +6,114 @@
 # For Hokkaido, CSVs are quarterly instead of yearly.
 
 # importing necessary modules
+import sys
 import pandas as pd
-import numpy as np
-from datetime import datetime
-
-def read_hokkaido_csv():
-    combined_data = pd.DataFrame()
-    for year in range(2016, datetime.now().year + 1): # 2016 - current year
-        for quarter in range(1, 5): # 1st quarter - 4th quarter
-            try:
-                csv = pd.read_csv('https://www.hepco.co.jp/network/renewable_energy/fixedprice_purchase/csv/sup_dem_results_' +
-                                  str(year) + '_' + str(quarter) + 'q.csv', header = 2, encoding = 'shift_jis')
-                csv.drop(labels=0, axis=0, inplace=True) # Delete the empty row at the beginning of the CSV
-                combined_data = combined_data.append(csv, ignore_index=True)
-            except: # If no such CSV exists yet, skip
-                continue
-
-    combined_data = combined_data.replace(np.nan).ffill() # Fill empty trailing values with last known value (for dates)
-    combined_data['時刻'] = combined_data['時刻'].str.replace(r'時$',':00') # Fix the format of the time. "時" means "hour".
-    combined_data.drop('供給力合計', axis=1, inplace=True) # Delete 供給力合計 column, it's just supply total.
-
-    # combine columns 'DATE' and 'TIME' to make a datetime object
-    combined_data['月日']=pd.to_datetime(combined_data['月日'] + ' ' + combined_data['時刻'], format='%Y/%m/%d %H:%M')
-    combined_data.drop('時刻', axis=1, inplace=True)
-
-    # Translate Japanese column names to English
-    combined_data.columns = ['Date_Time', 'Area_Demand', 'Nuclear', 'Thermal',
-                          'Hydraulic', 'Geothermal', 'Biomass', 'Solar(Actual)',
-                          'Solar(Output_Control)', 'Wind(Actual)', 'Wind(Output_Control)',
-                          'Pumped_Hydro', 'Interconnector']
-
-    # assign units and region
-    combined_data['Region'] = 'Hokkaido'
-    combined_data['Unit'] = 'MWh'
-
-    # get demand data into one df
-    demand_df = combined_data[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-    demand_df.sort_values(by=['Date_Time'],ascending=False, inplace=True)
-
-    # get supply data into another df
-    supply_df = combined_data
-    supply_df.drop('Area_Demand', axis=1, inplace=True)
-    supply_df = pd.melt(combined_data, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-    supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
-
-    # write df to csvs
-    # demand_df.to_csv('Hokkaido_Demand')
-    # supply_df.to_csv('Hokkaido_Supply')
-  
+from datetime import datetime, timedelta
+from functools import partial
+from data_scrapers.japan_archive.archive_output import compact, write_archive
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
+
+QUARTER_URL = ('https://www.hepco.co.jp/network/renewable_energy/fixedprice_purchase/csv/sup_dem_results_'
+               '{}_{}q.csv')
+# days after a quarter ends during which its file is still requested, as the
+# last days of a quarter are published and revised after the next one starts
+REVISION_GRACE_DAYS = 45
+
+def get_fiscal_quarter(date):
+    """
+    :param date: a datetime
+    :return: a tuple (fiscal year, quarter), e.g. February 2022 is (2021, 4)
+    """
+    fiscal_year = date.year if date.month >= 4 else date.year - 1
+    return fiscal_year, (date.month - 4) % 12 // 3 + 1
+
+def get_quarter_urls(now):
+    """
+    Lists the url of every quarter from 2016 up to the quarter after the current one.
+    :param now: the current datetime
+    :return: a tuple (urls, probe) where probe holds the urls of the current and
+             next quarter, and of the previous quarter during the first
+             REVISION_GRACE_DAYS of the current one: the files that can still
+             appear or change
+    """
+    current = get_fiscal_quarter(now)
+    previous = get_fiscal_quarter(now - timedelta(days=REVISION_GRACE_DAYS))
+    following = (current[0] + current[1] // 4, current[1] % 4 + 1)
+    quarters = [(year, quarter)
+                for year in range(2016, following[0] + 1) # 2016 - year of the next quarter
+                for quarter in range(1, 5) # 1st quarter - 4th quarter
+                if (year, quarter) <= following]
+    urls = [QUARTER_URL.format(year, quarter) for year, quarter in quarters]
+    probe = {QUARTER_URL.format(*quarter) for quarter in (previous, current, following)}
+    return urls, probe
+
+def read_hokkaido_chunks():
+    """
+    Yields each quarter's CSV without the empty row at its beginning.
+    """
+    urls, probe = get_quarter_urls(datetime.now())
+    # The manifest of sync_files remembers which quarters exist (with their
+    # validators) and which returned 404. Past quarters already in it are not
+    # requested again; only the current and next quarter (and the previous one
+    # shortly after it ended), and quarters never seen before, are probed. Network errors are logged by sync_files.
+    read_csv = partial(pd.read_csv, header = 2, encoding = 'shift_jis')
+    for url, path, changed, csv in sync_files('hokkaido', urls, parse=read_csv, probe=probe,
+                                              metrics=('archive', 'Hokkaido')):
+        yield csv.drop(labels=0, axis=0) # Delete the empty row at the beginning of the CSV
+
+def read_hokkaido_csv(wide=False):
+    """
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df), most recent data first
+    """
+    # Combine quarterly CSVs into one dataframe with a single concat
+    combined_data = pd.concat(read_hokkaido_chunks(), ignore_index=True)
+
+    with measure_stage('archive', 'Hokkaido', 'transform') as counts:
+        combined_data = combined_data.ffill() # Fill empty trailing values with last known value (for dates)
+        combined_data['時刻'] = combined_data['時刻'].str.replace(r'時$', ':00', regex=True) # Fix the format of the time. "時" means "hour".
+        combined_data.drop('供給力合計', axis=1, inplace=True) # Delete 供給力合計 column, it's just supply total.
+
+        # combine columns 'DATE' and 'TIME' to make a datetime object
+        combined_data['月日']=pd.to_datetime(combined_data['月日'] + ' ' + combined_data['時刻'], format='%Y/%m/%d %H:%M')
+        combined_data.drop('時刻', axis=1, inplace=True)
+
+        # Translate Japanese column names to English
+        combined_data.columns = ['Date_Time', 'Area_Demand', 'Nuclear', 'Thermal',
+                              'Hydraulic', 'Geothermal', 'Biomass', 'Solar(Actual)',
+                              'Solar(Output_Control)', 'Wind(Actual)', 'Wind(Output_Control)',
+                              'Pumped_Hydro', 'Interconnector']
+
+        # assign units and region
+        combined_data['Region'] = 'Hokkaido'
+        combined_data['Unit'] = 'MWh'
+
+        # get demand data into one df
+        demand_df = order_newest_first(combined_data[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
+
+        # get supply data into another df, one column per fuel type
+        supply_df = to_wide_supply(combined_data.drop('Area_Demand', axis=1))
+        if not wide:
+            supply_df = melt_supply(supply_df)
+
+        # write df to csvs
+        # demand_df.to_csv('Hokkaido_Demand')
+        # supply_df.to_csv('Hokkaido_Supply')
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
     return demand_df, supply_df
 
+def download_csv(output_format='csv'):
+    """
+    Writes the demand and supply data to csv files or the Parquet dataset.
+    :param output_format: 'csv' for Japan_Hokkaido_Demand_Data.csv and
+                          Japan_Hokkaido_Supply_Data.csv, 'parquet' for the dataset
+    """
+    demand_df, supply_df = read_hokkaido_csv()
+    write_archive(demand_df, supply_df, 'Hokkaido', output_format)
+
 if __name__ == '__main__':
-    hokkaido_data = read_hokkaido_csv()
-    hokkaido_data[0] # demand data
-    hokkaido_data[1] # supply data
\ No newline at end of file
+    download_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv')
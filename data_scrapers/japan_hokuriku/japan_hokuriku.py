@@ -3,9 +3,15 @@
 # Japanese to English. Most recent data appears up top. Supply data is broken
 # down by fuel types and all values are converted from 10,000 kWh to MWh.
 
-import requests
+import sys
+from functools import partial
 from bs4 import BeautifulSoup
 import pandas as pd
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import compact, write_parquet
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
 
 def get_page():
     """
@@ -13,7 +19,7 @@ def get_page():
     :return: BeautifulSoup object with HTML source codes
     """ 
     url = 'https://www.rikuden.co.jp/nw_jyukyudata/area_jisseki.html'
-    r = requests.get(url)
+    r = http_cache.get(url)
     if r.status_code != 200:
         raise Exception('Failed to load page {}'.format(url))
     page = BeautifulSoup(r.text, 'html.parser')
@@ -32,61 +38,106 @@ def get_csv_urls(page):
             csv_urls.append(base_url + anchor['href'])
     return csv_urls
 
-def download_csv():
+def read_hokuriku_files(incremental=False, wide=False):
     """
-    This is the main function for donwloading all CSV's that contain demand/
-    supply data from the webpage. It reads the CSV's as dataframes, cleans data,
-    and reads the reformatted data to separate files for demand and supply.
+    This function donwloads all CSV's that contain demand/supply data from the
+    webpage, reads the CSV's as dataframes and cleans data.
+    :param incremental: only reformat the files that are new or changed since the last run
+    :param wide: yield supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a generator of tuples (file name, demand_df, supply_df), one per CSV
     """
     page = get_page()
     csv_urls = get_csv_urls(page)
     
-    for url in csv_urls:
-        data = pd.read_csv(url, index_col=None, encoding= 'unicode_escape',
-                           skiprows=5, usecols=range(14))
-            
-        # remove empty rows-- some files contain trailing rows with no values
-        data = data.dropna(axis=0, how='all')
+    # files are downloaded and read concurrently, then cleaned one by one
+    read_csv = partial(pd.read_csv, index_col=None, encoding= 'unicode_escape',
+                       skiprows=5, usecols=range(14))
+    for url, path, changed, data in sync_files('hokuriku', csv_urls, parse=read_csv,
+                                               metrics=('archive', 'Hokuriku')):
+        # output files are written per source file, so unchanged files are already written
+        if incremental and not changed:
+            continue
             
-        # combine columns 'DATE' and 'TIME' to make a datetime object
-        if 'DATE' not in data.columns:
-            data.columns = data.iloc[0]
-            data.drop(index=0, axis=0, inplace=True)
-        data['DATE']=pd.to_datetime(data.DATE + ' ' + data.TIME, format='%Y/%m/%d %H:%M')
-        data.drop('TIME', axis=1, inplace=True)
+        with measure_stage('archive', 'Hokuriku', 'transform') as counts:
+            # remove empty rows-- some files contain trailing rows with no values
+            data = data.dropna(axis=0, how='all')
 
-        # rename fuel types
-        data.columns = ['Date_Time',
-                      'Area_Demand',
-                      'Nuclear Power',
-                      'Thermal Power',
-                      'Hydropower', 
-                      'Geothermal', 
-                      'Biomass', 
-                      'Solar Performance', 
-                      'Solar Supression Amount', 
-                      'Wind Performance', 
-                      'Wind Suppression Amount', 
-                      'Pumped Storage', 
-                      'Interconnector']
-        
-        # convert from kWh to MWh
-        # assign units and region
-        data.loc[:,data.columns!='Date_Time'] = data.loc[:,data.columns!='Date_Time'] * 10
-        data['Region'], data['Unit'] = ['Hokuriku', 'MWh']
+            # combine columns 'DATE' and 'TIME' to make a datetime object
+            if 'DATE' not in data.columns:
+                data.columns = data.iloc[0]
+                data.drop(index=0, axis=0, inplace=True)
+            data['DATE']=pd.to_datetime(data.DATE + ' ' + data.TIME, format='%Y/%m/%d %H:%M')
+            data.drop('TIME', axis=1, inplace=True)
+
+            # rename fuel types
+            data.columns = ['Date_Time',
+                          'Area_Demand',
+                          'Nuclear Power',
+                          'Thermal Power',
+                          'Hydropower', 
+                          'Geothermal', 
+                          'Biomass', 
+                          'Solar Performance', 
+                          'Solar Supression Amount', 
+                          'Wind Performance', 
+                          'Wind Suppression Amount', 
+                          'Pumped Storage', 
+                          'Interconnector']
 
-        # get demand data into one df
-        demand_df = data[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-        demand_df.sort_values(by=['Date_Time'],ascending=False, inplace=True)
+            # convert from kWh to MWh
+            # assign units and region
+            data.loc[:,data.columns!='Date_Time'] = data.loc[:,data.columns!='Date_Time'] * 10
+            data['Region'], data['Unit'] = ['Hokuriku', 'MWh']
 
-        # get supply data into another df
-        data.drop('Area_Demand', axis=1, inplace=True)
-        supply_df = pd.melt(data, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-        supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
+            # get demand data into one df
+            demand_df = order_newest_first(data[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
 
+            # get supply data into another df, one column per fuel type
+            supply_df = to_wide_supply(data.drop('Area_Demand', axis=1))
+            if not wide:
+                supply_df = melt_supply(supply_df)
+            demand_df = compact(demand_df, 'Area_Demand')
+            counts['rows'] = len(demand_df) + len(supply_df)
+        yield url[67:], demand_df, supply_df
+
+def read_hokuriku_data(wide=False):
+    """
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df) of all CSV's combined, most recent data first
+    """
+    files = list(read_hokuriku_files(wide=True))
+    with measure_stage('archive', 'Hokuriku', 'transform') as counts:
+        # the monthly files are combined in chronological order, each file's
+        # newest-first demand read backwards, so ordering the whole is a reversed view
+        demand_df = order_newest_first(pd.concat([demand.iloc[::-1] for name, demand, supply in files],
+                                                 ignore_index=True))
+        supply_df = to_wide_supply(pd.concat([supply for name, demand, supply in files]).reset_index())
+        if not wide:
+            supply_df = melt_supply(supply_df)
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
+    return demand_df, supply_df
+
+def download_csv(output_format='csv', incremental=False):
+    """
+    This is the main function for donwloading all CSV's that contain demand/
+    supply data from the webpage. It reads the CSV's as dataframes, cleans data,
+    and reads the reformatted data to separate files for demand and supply.
+    :param output_format: 'csv' for one csv per file, 'parquet' for the partitioned dataset
+    :param incremental: only reformat the files that are new or changed since the last run
+    """
+    for name, demand_df, supply_df in read_hokuriku_files(incremental):
         # write df to csvs
-        demand_df.to_csv('Hokuriku_Demand_{}'.format(url[67:]), index=False)
-        supply_df.to_csv('Hokuriku_Supply_{}'.format(url[67:]), index=False)
+        with measure_stage('archive', 'Hokuriku', 'write') as counts:
+            if output_format == 'parquet':
+                write_parquet(demand_df, supply_df, 'Hokuriku', name)
+            else:
+                demand_df.to_csv('Hokuriku_Demand_{}'.format(name), index=False)
+                supply_df.to_csv('Hokuriku_Supply_{}'.format(name), index=False)
+            counts['rows'] = len(demand_df) + len(supply_df)
         
 if __name__ == '__main__':
-    download_csv()
\ No newline at end of file
+    download_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv',
+                 incremental='--incremental' in sys.argv[1:])
\ No newline at end of file
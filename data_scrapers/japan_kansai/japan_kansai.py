@@ -1,57 +1,80 @@
+import sys
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from urllib.request import Request, urlopen  # Python 3
+from functools import partial
+from data_scrapers.japan_archive.archive_output import compact, write_archive
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
 
-def read_kansai_csv():
-    combined_data = pd.DataFrame()
-    for year in range(2016, datetime.now().year + 1):
-        # Bypass 403 Forbidden error
-        req = Request('https://www.kansai-td.co.jp/denkiyoho/csv/area_jyukyu_jisseki_' +
-                          str(year) + '.csv')
-        req.add_header('User-Agent', 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0')
-        content = urlopen(req)
+COLUMNS = ['Date_Time', 'Area_Demand', 'Nuclear', 'Thermal',
+           'Hydraulic', 'Geothermal', 'Biomass', 'Solar(Actual)',
+           'Solar(Output_Control)', 'Wind(Actual)', 'Wind(Output_Control)',
+           'Pumped_Hydro', 'Interconnector']
 
-        csv = pd.read_csv(content, header = 1, encoding = 'shift_jis')
+def read_kansai_chunks():
+    """
+    Yields each year's CSV without its trailing NaN columns and with its
+    Japanese column names translated to English.
+    """
+    urls = ['https://www.kansai-td.co.jp/denkiyoho/csv/area_jyukyu_jisseki_' + str(year) + '.csv'
+            for year in range(2016, datetime.now().year + 1)]
+    # Bypass 403 Forbidden error
+    headers = {'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:77.0) Gecko/20100101 Firefox/77.0'}
+    # only new or changed years are downloaded, the others are read from the local copies
+    read_csv = partial(pd.read_csv, header = 1, encoding = 'shift_jis')
+    for url, path, changed, csv in sync_files('kansai', urls, headers=headers, parse=read_csv,
+                                              metrics=('archive', 'Kansai')):
+        # Drop NaN columns
+        csv = csv.iloc[:, :13]
+        csv.columns = COLUMNS
+        yield csv
 
-        # Combine multi-year CSVs into one dataframe
-        combined_data = combined_data.append(csv, ignore_index=True)
+def read_kansai_csv(wide=False):
+    """
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df), most recent data first
+    """
+    # Combine multi-year CSVs into one dataframe with a single concat
+    combined_data = pd.concat(read_kansai_chunks(), ignore_index=True)
 
-        # Drop NaN columns
-        combined_data.drop(combined_data.iloc[:, 13:], axis=1, inplace=True)
-
-    # Translate Japanese column names to English
-    combined_data.columns = ['Date_Time', 'Area_Demand', 'Nuclear', 'Thermal',
-                          'Hydraulic', 'Geothermal', 'Biomass', 'Solar(Actual)',
-                          'Solar(Output_Control)', 'Wind(Actual)', 'Wind(Output_Control)',
-                          'Pumped_Hydro', 'Interconnector']
-
-    # assign units and region
-    combined_data['Region'] = 'Kansai'
-    combined_data['Unit'] = 'MWh'
-
-    # Format the datetime
-    combined_data['Date_Time']=pd.to_datetime(combined_data['Date_Time'], format='%Y/%m/%d %H:%M')
-
-    # get demand data into one df
-    demand_df = combined_data[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-    demand_df.sort_values(by=['Date_Time'],ascending=False, inplace=True)
-    # Drop NaN rows (not sure why there are NaN rows...)
-    demand_df.dropna(inplace = True)
-
-    # get supply data into another df
-    supply_df = combined_data
-    supply_df.drop('Area_Demand', axis=1, inplace=True)
-    # Pivot "wide" to "long" format
-    supply_df = pd.melt(combined_data, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-    supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
-    # Drop NaN rows (not sure why there are NaN rows...)
-    supply_df.dropna(inplace = True)
+    with measure_stage('archive', 'Kansai', 'transform') as counts:
+        # assign units and region
+        combined_data['Region'] = 'Kansai'
+        combined_data['Unit'] = 'MWh'
+
+        # Format the datetime
+        combined_data['Date_Time']=pd.to_datetime(combined_data['Date_Time'], format='%Y/%m/%d %H:%M')
+
+        # rows without a date would break the chronological order
+        combined_data = combined_data[combined_data['Date_Time'].notna()]
 
+        # get demand data into one df
+        demand_df = order_newest_first(combined_data[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
+        # Drop NaN rows (not sure why there are NaN rows...)
+        demand_df = demand_df.dropna()
+
+        # get supply data into another df, one column per fuel type
+        supply_df = to_wide_supply(combined_data.drop('Area_Demand', axis=1))
+        if not wide:
+            # Pivot "wide" to "long" format
+            supply_df = melt_supply(supply_df)
+            # Drop NaN rows (not sure why there are NaN rows...)
+            supply_df = supply_df.dropna()
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
     return demand_df, supply_df
 
-if __name__ == '__main__':
+def download_csv(output_format='csv'):
+    """
+    Writes the demand and supply data to csv files or the Parquet dataset.
+    :param output_format: 'csv' for Japan_Kansai_Demand_Data.csv and
+                          Japan_Kansai_Supply_Data.csv, 'parquet' for the dataset
+    """
     demand_df, supply_df = read_kansai_csv()
-#     demand_df
-#     supply_df
-    
\ No newline at end of file
+    write_archive(demand_df, supply_df, 'Kansai', output_format)
+
+if __name__ == '__main__':
+    download_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv')
@@ -1,85 +1,160 @@
-import requests
+import io
+import sys
 import pandas as pd
-import numpy as np
 from bs4 import BeautifulSoup
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import compact, write_parquet
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
+
+COLUMNS = ['Date_Time',
+           'Area_Demand',
+           'Nuclear Power',
+           'Thermal Power',
+           'Hydropower',
+           'Geothermal',
+           'Biomass',
+           'Solar performance',
+           'Solar Supression Amount',
+           'Wind Performance',
+           'Wind Suppression Amount',
+           'Pumped storage',
+           'Interconnector']
+
+def to_number(column):
+    """
+    Converts a column read as text to numbers, NaN where a cell is not a number.
+    :param column: a pandas Series
+    :return: a numeric pandas Series
+    """
+    if column.dtype == object or pd.api.types.is_string_dtype(column):
+        column = column.str.replace(',', '', regex=False)
+    return pd.to_numeric(column, errors='coerce')
 
-def download_Kyushu_Supply_Demand_data():
+def clean_kyushu_data(df):
     """
-    This function downloads all past demand and supply data from the url, 
-    clean the data and translate column names, and reads to CSV files.
-    Supply data is broken down by fuel type and most recent data appears from the top.
+    Cleans one Kyushu csv with whole-frame operations. The first data row
+    holds the Japanese header, so it is dropped and the columns are
+    translated; rows with no values are removed and values are converted
+    to numbers.
+    :param df: dataframe as read from a Kyushu csv
+    :return: dataframe with one row per hour and one column per fuel type
+    """
+    df = df.iloc[1:].dropna(axis=0, how='all').reset_index(drop=True)
+    df.columns = COLUMNS
+    df['Date_Time'] = pd.to_datetime(df['Date_Time'])
+    df[COLUMNS[1:]] = df[COLUMNS[1:]].apply(to_number)
+    return df
+
+def split_demand_supply(df, wide=False):
+    """
+    Splits a cleaned Kyushu dataframe into demand data and long-format
+    supply data, most recent data first.
+    :param df: dataframe returned by clean_kyushu_data
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df)
+    """
+    # assign units and region
+    df = df.assign(Region='Kyushu', Unit='MWh')
+
+    # get demand data into one df
+    # most recent data appears up top
+    demand_df = order_newest_first(df[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
+
+    # get supply data into another df, one column per fuel type
+    supply_df = to_wide_supply(df.drop('Area_Demand', axis=1))
+    if not wide:
+        # most recent data appears up top
+        supply_df = melt_supply(supply_df)
+    return compact(demand_df, 'Area_Demand'), supply_df
+
+def get_csv_urls():
+    """
+    This function gets the urls of the supply/demand CSVs from the url
+    :return: a list of csv urls
     """
     url = "https://www.kyuden.co.jp/td_service_wheeling_rule-document_disclosure"
-    response = requests.get(url)
+    response = http_cache.get(url)
 
     # response.status_code is 200 if the website didn't block it
     # raise error if response.status_code != 200
     if response.status_code != 200: 
         raise Exception('Failed to load page {}'.format(url))
-    else:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        td_elem = soup.findAll('td', {'class': 'n_align_center'})
-        csv_href = []
-        for td in td_elem:
-            csv_a = td.find('a', {'class': 'n_icon_excel'})
-            if csv_a:
-                csv_href.append(csv_a.get('href'))
-
-        for i in range(len(csv_href)):
-            csv_url = "https://www.kyuden.co.jp/" + csv_href[i]
-            df = pd.read_csv(csv_url, encoding='shift-jis')
-
-            # data cleaning
-            dflist = []
-            for i in range(1, len(df)):
-                data_list = list(df.iloc[i])
-                if not np.all(pd.isna(data_list)): 
-                    dflist.append(data_list)
-
-            df = pd.DataFrame(dflist, columns=list(df.iloc[0]))
-            df.columns = ['Date_Time',
-                        'Area_Demand',
-                       'Nuclear Power', 
-                       'Thermal Power',
-                       'Hydropower',
-                       'Geothermal', 
-                       'Biomass',
-                       'Solar performance', 
-                       'Solar Supression Amount', 
-                       'Wind Performance',
-                       'Wind Suppression Amount',
-                       'Pumped storage',
-                       'Interconnector']
-
-            # assign units and region
-            df['Region'] = 'Kyushu'
-            df['Unit'] = 'MWh'
-
-            # get demand data into one df
-            demand_df = df[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-            # sort by datetime so that most recent data appears up top
-            demand_df.sort_values(by=['Date_Time'], ascending=False, inplace=True)
-
-
-            # get supply data into another df
-            supply_df = df.copy()
-            supply_df.drop('Area_Demand', axis=1, inplace=True)
-            supply_df = pd.melt(supply_df, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-            # sort by datetime so that most recent data appears up top
-            supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
-
-            start_date = df['Date_Time'][0].split()[0].replace('/', '-')
-            end_date = df['Date_Time'][df['Date_Time'].size-1].split()[0].replace('/', '-')
-
-
-            # write df to csvs
-            demand_df.to_csv('Kyushu_Demand_{}.csv'.format(start_date+"_to_"+end_date), index=False)
-            supply_df.to_csv('Kyushu_Supply_{}.csv'.format(start_date+"_to_"+end_date), index=False)
-
-
-def main():
-    download_Kyushu_Supply_Demand_data()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    td_elem = soup.findAll('td', {'class': 'n_align_center'})
+    csv_href = []
+    for td in td_elem:
+        csv_a = td.find('a', {'class': 'n_icon_excel'})
+        if csv_a:
+            csv_href.append(csv_a.get('href'))
+    return ["https://www.kyuden.co.jp/" + href for href in csv_href]
+
+def read_kyushu_files(wide=False):
+    """
+    This function downloads all past demand and supply data from the url,
+    clean the data and translate column names.
+    :param wide: yield supply data with one column per fuel type, see split_demand_supply
+    :return: a generator of tuples (date range of the file, demand_df, supply_df), one per CSV
+    """
+    for csv_url in get_csv_urls():
+        with measure_stage('archive', 'Kyushu', 'fetch') as counts:
+            r = http_cache.get(csv_url)
+            counts.update(status=r.status_code, bytes=len(r.content))
+            if r.status_code != 200:
+                raise Exception('Failed to load page {}'.format(csv_url))
+        with measure_stage('archive', 'Kyushu', 'parse') as counts:
+            df = pd.read_csv(io.BytesIO(r.content), encoding='shift-jis')
+            counts.update(bytes=len(r.content), rows=len(df))
+        with measure_stage('archive', 'Kyushu', 'transform') as counts:
+            df = clean_kyushu_data(df)
+            demand_df, supply_df = split_demand_supply(df, wide)
+            counts['rows'] = len(demand_df) + len(supply_df)
+
+        start_date = df['Date_Time'].iloc[0].strftime('%Y-%m-%d')
+        end_date = df['Date_Time'].iloc[-1].strftime('%Y-%m-%d')
+        yield start_date+"_to_"+end_date, demand_df, supply_df
+
+def read_kyushu_data(wide=False):
+    """
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df) of all CSV's combined, most recent data first
+    """
+    files = list(read_kyushu_files(wide=True))
+    with measure_stage('archive', 'Kyushu', 'transform') as counts:
+        # the yearly files are combined in chronological order, each file's
+        # newest-first demand read backwards, so ordering the whole is a reversed view
+        demand_df = order_newest_first(pd.concat([demand.iloc[::-1] for name, demand, supply in files],
+                                                 ignore_index=True))
+        supply_df = to_wide_supply(pd.concat([supply for name, demand, supply in files]).reset_index())
+        if not wide:
+            supply_df = melt_supply(supply_df)
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
+    return demand_df, supply_df
+
+def download_Kyushu_Supply_Demand_data(output_format='csv'):
+    """
+    This function downloads all past demand and supply data from the url, 
+    clean the data and translate column names, and reads to CSV files.
+    Supply data is broken down by fuel type and most recent data appears from the top.
+    :param output_format: 'csv' for one csv per file, 'parquet' for the partitioned dataset
+    """
+    for name, demand_df, supply_df in read_kyushu_files():
+        # write df to csvs
+        with measure_stage('archive', 'Kyushu', 'write') as counts:
+            if output_format == 'parquet':
+                write_parquet(demand_df, supply_df, 'Kyushu', name)
+            else:
+                demand_df.to_csv('Kyushu_Demand_{}.csv'.format(name), index=False)
+                supply_df.to_csv('Kyushu_Supply_{}.csv'.format(name), index=False)
+            counts['rows'] = len(demand_df) + len(supply_df)
+
+
+def main(output_format='csv'):
+    download_Kyushu_Supply_Demand_data(output_format)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main('parquet' if '--parquet' in sys.argv[1:] else 'csv')
\ No newline at end of file
@@ -0,0 +1,124 @@
+# Shared parser for the realtime demand CSVs published by the Japanese utilities.
+# Every utility publishes the same layout: a few Shift-JIS header lines, then an
+# hourly table (24 rows) and a 5-minute table (288 rows), each starting with a
+# line containing 'DATE,TIME,'. Some utilities add extra columns (Kyushu adds an
+# hourly reserve rate, Tohoku adds 5-minute wind performance), so the number of
+# value columns is read from the table header instead of being assumed.
+# Values are returned exactly as published (10,000 kW for most columns); the
+# per-region field lists passed to format_rows carry the unit conversion.
+import datetime
+from collections import namedtuple
+import numpy as np
+
+TABLE_MARKER = b'DATE,TIME,'
+HOURLY_LENGTH = 24
+FIVE_MIN_LENGTH = 288
+
+# (Data_Type, Unit, multiplier) for every value column after DATE and TIME
+HOURLY_FIELDS = [('Hourly Performance', 'MW', 10),
+                 ('Estimated Hourly Performance', 'MW', 10),
+                 ('Hourly Usage Rate', '%', 1),
+                 ('Hourly Supply', 'MW', 10)]
+FIVE_MIN_FIELDS = [('5-Minute Performance', 'MW', 10),
+                   ('5-Minute Solar Performance', 'MW', 10)]
+
+# date_time: datetime64[m] array, one entry per row
+# values: float64 array of shape (rows, value columns), NaN where the cell is empty
+# filled: number of leading rows that have been published so far
+RealtimeTable = namedtuple('RealtimeTable', ['date_time', 'values', 'filled'])
+
+def get_table_positions(lines):
+    """
+    Finds the header line of every table in the csv file in a single pass.
+    :param lines: a list of all lines (bytes) in the csv file
+    :return: a list of the positions of the 1 hour and 5 minute table headers
+    """
+    return [i for i, line in enumerate(lines) if TABLE_MARKER in line]
+
+def parse_date_time(dates, times):
+    """
+    Converts the DATE and TIME columns of a table to datetime64 values.
+    A file covers one or two days, so each distinct date is parsed once and
+    the time of day is added as a vectorized offset.
+    :param dates: array of date strings (bytes), e.g. b'2022/5/1'
+    :param times: array of time strings (bytes), e.g. b'13:05'
+    :return: datetime64[m] array, NaT where the date is missing
+    """
+    unique_dates, inverse = np.unique(dates, return_inverse=True)
+    days = np.array([np.datetime64(datetime.datetime.strptime(d.decode(), '%Y/%m/%d'), 'm')
+                     if d else np.datetime64('NaT', 'm') for d in unique_dates],
+                    dtype='datetime64[m]')
+    hour_minute = np.char.partition(np.where(times == b'', b'0:00', times), b':')
+    minutes = hour_minute[:, 0].astype(np.int64) * 60 + hour_minute[:, 2].astype(np.int64)
+    return days[inverse] + minutes.astype('timedelta64[m]')
+
+def parse_table(lines, table_pos, table_length):
+    """
+    Parses the rows following a table header into typed arrays.
+    A row counts as published when its first value column is neither empty
+    nor 0 (unpublished hourly rows are filled with 0, 5-minute rows are empty).
+    :param lines: a list of all lines (bytes) in the csv file
+    :param table_pos: the position of the table header
+    :param table_length: the expected length of either the one-hour or 5-min table
+    :return: RealtimeTable with every row of the table
+    """
+    width = len(lines[table_pos].rstrip().rstrip(b',').split(b','))
+    rows = []
+    for line in lines[table_pos + 1:table_pos + 1 + table_length]:
+        row = line.rstrip().split(b',')
+        if len(row) < 3:
+            break
+        rows.append((row + [b''] * width)[:width])
+    if not rows:
+        return RealtimeTable(np.array([], dtype='datetime64[m]'),
+                             np.empty((0, width - 2)), 0)
+
+    cells = np.char.strip(np.array(rows, dtype=bytes))
+    date_time = parse_date_time(cells[:, 0], cells[:, 1])
+    raw = cells[:, 2:]
+    values = np.where(raw == b'', b'nan', raw).astype(np.float64)
+
+    published = ~np.isnan(values[:, 0]) & (values[:, 0] != 0)
+    filled = len(published) if published.all() else int(np.argmin(published))
+    return RealtimeTable(date_time, values, filled)
+
+def parse_realtime_csv(content, hourly_length=HOURLY_LENGTH, five_min_length=FIVE_MIN_LENGTH):
+    """
+    Parses a realtime demand csv into its hourly and 5-minute tables.
+    :param content: raw bytes of the csv file as downloaded
+    :param hourly_length: the expected length of the one-hour table
+    :param five_min_length: the expected length of the 5-min table
+    :return: a tuple of RealtimeTable (hourly, five_min)
+    """
+    lines = content.splitlines()
+    table_pos = get_table_positions(lines)
+    if len(table_pos) < 2:
+        raise Exception('Expected an hourly and a 5-minute table, found {}'.format(len(table_pos)))
+    hourly = parse_table(lines, table_pos[0], hourly_length)
+    five_min = parse_table(lines, table_pos[1], five_min_length)
+    return hourly, five_min
+
+def format_rows(table, region, fields, start=None):
+    """
+    Reformats published rows of a table to categories: Date_Time, Region,
+    Data_Type, Unit and Value.
+    :param table: RealtimeTable returned by parse_realtime_csv
+    :param region: the region name written to every row
+    :param fields: list of (Data_Type, Unit, multiplier), one per value column
+    :param start: index of the first row to format, by default only the
+                  latest published row is formatted
+    :return: a list of dictionaries of formatted performance data
+    """
+    if start is None:
+        start = table.filled - 1
+    start = max(start, 0)
+    date_times = table.date_time[start:table.filled].astype('datetime64[s]').tolist()
+    values = table.values[start:table.filled, :len(fields)]
+
+    formatted_data = []
+    for date_time, row in zip(date_times, values):
+        for (data_type, unit, multiplier), value in zip(fields, row):
+            formatted_data.append({'Date_Time': date_time, 'Region': region,
+                                   'Data_Type': data_type, 'Unit': unit,
+                                   'Value': None if np.isnan(value) else int(value) * multiplier})
+    return formatted_data
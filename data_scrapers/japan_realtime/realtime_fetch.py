@@ -0,0 +1,75 @@
+# Conditional download of the realtime demand CSVs. The utilities only add a
+# row every 5 minutes, so most polls would re-download and re-parse a file that
+# has not changed. For every region this remembers the validators (ETag and
+# Last-Modified) and a hash of the last body that was written, sends them back
+# as If-None-Match / If-Modified-Since, and reports an unchanged file so the
+# caller can skip parsing and writing entirely.
+import hashlib
+import json
+import os
+from data_scrapers.scrape_metrics import measure_stage
+
+def get_state_file(region):
+    """
+    :param region: the region name
+    :return: path of the file holding the region's fetch state
+    """
+    return 'Realtime_{}_Fetch_State.json'.format(region)
+
+def load_fetch_state(region):
+    """
+    Loads the validators and body hash saved by the last successful run.
+    :param region: the region name
+    :return: dictionary with url, etag, last_modified and sha256 (empty if no state)
+    """
+    state_file = get_state_file(region)
+    if not os.path.isfile(state_file):
+        return {}
+    with open(state_file) as f:
+        return json.load(f)
+
+def save_fetch_state(region, state):
+    """
+    Saves the validators and body hash of a csv that has been written. This is
+    called after writing so a failed write is retried on the next poll.
+    :param region: the region name
+    :param state: dictionary returned by fetch_if_changed
+    """
+    state_file = get_state_file(region)
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_file + '.tmp', state_file)
+
+def fetch_if_changed(session, region, url):
+    """
+    Downloads the csv unless it is unchanged since the last saved state.
+    :param session: http_cache module or a requests.Session
+    :param region: the region name
+    :param url: the url of the csv
+    :return: a tuple (content, state); content is None when the csv is unchanged
+    """
+    previous = load_fetch_state(region)
+    headers = {}
+    # validators only apply to the same url, Tohoku and Chugoku publish a new file every day
+    if previous.get('url') == url:
+        if previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'):
+            headers['If-Modified-Since'] = previous['last_modified']
+
+    with measure_stage('realtime', region, 'fetch') as counts:
+        r = session.get(url, headers=headers)
+        counts.update(status=r.status_code, bytes=len(r.content))
+        if r.status_code == 304:
+            return None, previous
+        if r.status_code != 200:
+            raise Exception('Failed to load page {}'.format(url))
+
+    state = {'url': url,
+             'etag': r.headers.get('ETag'),
+             'last_modified': r.headers.get('Last-Modified'),
+             'sha256': hashlib.sha256(r.content).hexdigest()}
+    if previous.get('url') == url and previous.get('sha256') == state['sha256']:
+        save_fetch_state(region, state)
+        return None, state
+    return r.content, state
@@ -0,0 +1,157 @@
+# Long-running poller for all realtime scrapers. Instead of launching every
+# japan_*_realtime_scraper.py from cron as a separate process, this schedules
+# each region's main() on one thread pool with its own polling interval, so a
+# slow utility host only delays its own region. With --metrics, the stages of
+# every poll are exported as soon as it finishes, see scrape_metrics; with
+# --http-cache, the polls are recorded or replayed, see http_cache.
+# Run from the root of the repository:
+#   python -m data_scrapers.japan_realtime.realtime_poller --workers 4 --interval Tohoku=600
+import argparse
+import importlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from data_scrapers import http_cache
+from data_scrapers.scrape_metrics import pop_records, record_failure, write_metrics
+
+# region name -> module with a main(session) function
+REALTIME_SCRAPERS = {
+    'Hokkaido': 'data_scrapers.japan_hokkaido.japan_hokkaido_realtime_scraper',
+    'Tohoku': 'data_scrapers.japan_tohoku.japan_tohoku_realtime_scraper',
+    'Hokuriku': 'data_scrapers.japan_hokuriku.japan_hokuriku_realtime_scraper',
+    'Chubu': 'data_scrapers.japan_chubu.japan_chubu_realtime_scraper',
+    'Kansai': 'data_scrapers.japan_kansai.japan_kansai_realtime_scraper',
+    'Chugoku': 'data_scrapers.japan_chugoku.japan_chugoku_realtime_scraper',
+    'Shikoku': 'data_scrapers.japan_shikoku.japan_shikoku_realtime_scraper',
+    'Kyushu': 'data_scrapers.japan_kyushu.japan_kyushu_realtime_scraper',
+}
+
+# the utilities publish a new 5-minute row every 5 minutes
+DEFAULT_INTERVAL = 300
+DEFAULT_WORKERS = 4
+REQUEST_TIMEOUT = 60
+
+logger = logging.getLogger(__name__)
+
+class TimeoutSession(requests.Session):
+    """
+    requests.Session that applies a default timeout, so a host that stops
+    responding cannot hold a worker thread forever. Its requests go through
+    the configured HTTP cache, see http_cache.
+    """
+    def __init__(self):
+        super().__init__()
+        http_cache.install(self)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+def poll_region(region, scraper, session, backfill=False, metrics=None):
+    """
+    Runs one poll of a region's realtime scraper and logs the outcome.
+    Errors are logged rather than raised so one failing region does not stop
+    the others.
+    :param region: the region name
+    :param scraper: the imported realtime scraper module
+    :param session: the region's requests session, reused between polls
+    :param backfill: write every published row not stored yet, see the scrapers' main()
+    :param metrics: path the poll's stage metrics are exported to, see
+                    scrape_metrics.write_metrics; None to discard them
+    """
+    start = time.monotonic()
+    try:
+        scraper.main(session, backfill)
+    except Exception as e:
+        logger.exception('%s: poll failed', region)
+        record_failure('realtime', region, e, time.monotonic() - start)
+    else:
+        logger.info('%s: polled in %.2fs', region, time.monotonic() - start)
+    # the regions are polled on threads, so only this region's stages are taken
+    records = pop_records(region)
+    if metrics:
+        try:
+            write_metrics(metrics, records)
+        except OSError:
+            logger.exception('%s: failed to write metrics to %s', region, metrics)
+
+def run_poller(regions=None, intervals=None, workers=DEFAULT_WORKERS, backfill=False, iterations=None,
+               metrics=None):
+    """
+    Polls the selected regions forever (or for the given number of scheduling
+    rounds). A region is not resubmitted while its previous poll is still
+    running, and missed polls are skipped rather than queued up.
+    :param regions: list of region names, defaults to every region in REALTIME_SCRAPERS
+    :param intervals: dict of region name -> polling interval in seconds
+    :param workers: maximum number of regions polled at the same time
+    :param backfill: write every published row not stored yet, so regions can be
+                     polled every 30-60 minutes without losing intervals
+    :param iterations: stop after this many scheduling rounds, None to run forever
+    :param metrics: path the stage metrics of every poll are exported to, see
+                    scrape_metrics.write_metrics
+    """
+    regions = regions or list(REALTIME_SCRAPERS)
+    intervals = intervals or {}
+    scrapers = {region: importlib.import_module(REALTIME_SCRAPERS[region]) for region in regions}
+    sessions = {region: TimeoutSession() for region in regions}
+    next_run = {region: time.monotonic() for region in regions}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while iterations is None or iterations > 0:
+            now = time.monotonic()
+            for region in regions:
+                if next_run[region] > now or (region in running and not running[region].done()):
+                    continue
+                running[region] = executor.submit(poll_region, region, scrapers[region],
+                                                   sessions[region], backfill, metrics)
+                interval = intervals.get(region, DEFAULT_INTERVAL)
+                while next_run[region] <= now:
+                    next_run[region] += interval
+            if iterations is not None:
+                iterations -= 1
+            time.sleep(max(min(next_run.values()) - time.monotonic(), 0.1))
+
+def parse_intervals(values):
+    """
+    Parses REGION=SECONDS command line values.
+    :param values: list of strings like 'Tohoku=600'
+    :return: dict of region name -> interval in seconds
+    """
+    intervals = {}
+    for value in values:
+        region, seconds = value.split('=')
+        if region not in REALTIME_SCRAPERS:
+            raise ValueError('Unknown region {}'.format(region))
+        intervals[region] = float(seconds)
+    return intervals
+
+def main():
+    parser = argparse.ArgumentParser(description='Poll the realtime data of every Japanese region.')
+    parser.add_argument('--regions', nargs='+', choices=list(REALTIME_SCRAPERS),
+                        help='regions to poll (default: all)')
+    parser.add_argument('--interval', nargs='+', default=[], metavar='REGION=SECONDS',
+                        help='polling interval for a region (default: {}s)'.format(DEFAULT_INTERVAL))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='maximum number of regions polled at the same time')
+    parser.add_argument('--backfill', action='store_true',
+                        help='write every published row of the day instead of only the latest')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='export stage metrics to a Prometheus textfile (*.prom) or JSON lines')
+    parser.add_argument('--http-cache', choices=http_cache.MODES,
+                        help='record, replay or refresh the HTTP responses, see http_cache')
+    parser.add_argument('--http-cache-dir', default=http_cache.HTTP_CACHE_DIR,
+                        help='folder of the HTTP cache (default: %(default)s)')
+    parser.add_argument('--max-age', type=float, default=http_cache.DEFAULT_MAX_AGE,
+                        help='seconds a cached response is served in refresh mode (default: %(default)s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.http_cache:
+        http_cache.configure(args.http_cache, args.http_cache_dir, args.max_age)
+    run_poller(args.regions, parse_intervals(args.interval), args.workers, args.backfill,
+               metrics=args.metrics)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Idempotent writer for Realtime_<Region>_Data.csv. Next to the csv it keeps a
+# key index directory with one small file per day listing the
+# (Date_Time, Data_Type) pairs already written. Before appending, only the index
+# files of the days being written are loaded, so duplicate checks are set
+# lookups and the cost of a write does not grow with the size of the csv.
+# Rows are appended to the csv before their keys are added to the index, so an
+# interrupted run can at worst repeat the rows of that one run.
+# If the csv is deleted or rotated while its index stays, the index is rebuilt
+# (empty) before keys are checked, so the new csv is written from scratch.
+import csv
+import os
+import shutil
+
+CSV_COLUMNS = ['Date_Time', 'Region', 'Data_Type', 'Unit', 'Value']
+
+def get_index_dir(csv_file):
+    """
+    :param csv_file: path of the Realtime_<Region>_Data.csv file
+    :return: path of the key index directory for the csv file
+    """
+    return os.path.splitext(csv_file)[0] + '_Index'
+
+def get_day(date_time):
+    """
+    :param date_time: a datetime or its string form, e.g. '2022-05-01 13:05:00'
+    :return: the day the row belongs to, e.g. '2022-05-01'
+    """
+    return str(date_time)[:10]
+
+def build_index(csv_file, index_dir):
+    """
+    Builds the key index from an existing csv that was written without one.
+    This is the only time the csv is read.
+    :param csv_file: path of the Realtime_<Region>_Data.csv file
+    :param index_dir: path of the key index directory
+    """
+    keys_by_day = {}
+    # left over by an interrupted build
+    shutil.rmtree(index_dir + '.tmp', ignore_errors=True)
+    if os.path.isfile(csv_file):
+        with open(csv_file, newline='') as f:
+            for row in csv.DictReader(f):
+                keys_by_day.setdefault(get_day(row['Date_Time']), set()).add(
+                    (row['Date_Time'], row['Data_Type']))
+    os.makedirs(index_dir + '.tmp', exist_ok=True)
+    for day, keys in keys_by_day.items():
+        write_keys(index_dir + '.tmp', day, keys)
+    os.replace(index_dir + '.tmp', index_dir)
+
+def read_keys(index_dir, day):
+    """
+    :param index_dir: path of the key index directory
+    :param day: the day to read, e.g. '2022-05-01'
+    :return: set of (Date_Time, Data_Type) string tuples already written for the day
+    """
+    index_file = os.path.join(index_dir, day + '.keys')
+    if not os.path.isfile(index_file):
+        return set()
+    with open(index_file, newline='') as f:
+        return {tuple(line) for line in csv.reader(f)}
+
+def write_keys(index_dir, day, keys):
+    """
+    Appends keys to the index file of a day.
+    :param index_dir: path of the key index directory
+    :param day: the day the keys belong to
+    :param keys: iterable of (Date_Time, Data_Type) string tuples
+    """
+    with open(os.path.join(index_dir, day + '.keys'), 'a', newline='') as f:
+        csv.writer(f).writerows(keys)
+
+def append_rows(csv_file, data):
+    """
+    Appends the rows that are not in the csv yet, writing the header if the
+    file does not exist.
+    :param csv_file: path of the Realtime_<Region>_Data.csv file
+    :param data: list of dictionaries of formatted performance data
+    :return: number of rows written
+    """
+    index_dir = get_index_dir(csv_file)
+    csv_missing = not os.path.isfile(csv_file) or os.path.getsize(csv_file) == 0
+    if csv_missing and os.path.isdir(index_dir):
+        # the csv was deleted or rotated: its keys no longer describe what is written
+        shutil.rmtree(index_dir)
+    if not os.path.isdir(index_dir):
+        build_index(csv_file, index_dir)
+
+    stored_keys = {}
+    new_rows = []
+    new_keys = {}
+    for row in data:
+        key = (str(row['Date_Time']), row['Data_Type'])
+        day = get_day(key[0])
+        if day not in stored_keys:
+            stored_keys[day] = read_keys(index_dir, day)
+        if key in stored_keys[day]:
+            continue
+        stored_keys[day].add(key)
+        new_keys.setdefault(day, []).append(key)
+        new_rows.append(row)
+    if not new_rows:
+        return 0
+
+    write_header = csv_missing
+    with open(csv_file, 'a', newline='') as f:
+        csvwriter = csv.DictWriter(f, CSV_COLUMNS)
+        if write_header:
+            csvwriter.writeheader()
+        csvwriter.writerows(new_rows)
+    for day, keys in new_keys.items():
+        write_keys(index_dir, day, keys)
+    return len(new_rows)
@@ -3,10 +3,16 @@
 # Converts all demand and supply values from 10,000 kWh to MWh and reads 
 # formatted data to two csv files: one for demand data and one for supply
 
-import requests
+import sys
+from functools import partial
 from bs4 import BeautifulSoup
 import pandas as pd
 import numpy as np
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import compact, write_archive
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
 
 def get_page():
     """
@@ -14,7 +20,7 @@ def get_page():
     :return: BeautifulSoup object with HTML source codes
     """
     url = 'https://www.yonden.co.jp/nw/renewable_energy/data/supply_demand.html'
-    r = requests.get(url)
+    r = http_cache.get(url)
     if r.status_code != 200:
         r.raise_for_status()
     page = BeautifulSoup(r.text, "html.parser")
@@ -35,45 +41,59 @@ def get_excel_urls(page):
         excel_urls.append(base_url + link)
     return excel_urls
 
-def download_data_to_csv():
+def read_shikoku_data(wide=False):
     """
-    This function downloads past demand/supply data, reformats data, and
-    reads demand data to one csv and supply data to another csv
+    This function downloads past demand/supply data and reformats data
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df), most recent data first
     """
     page = get_page()
     excel_urls = get_excel_urls(page)
     
-    # reads and combine all data into a single df
-    data = [pd.read_excel(url, skiprows=8, usecols=range(0,14), skipfooter=1) for url in excel_urls]
+    # downloads new or changed excels concurrently, reads and combine all data into a single df
+    read_excel = partial(pd.read_excel, skiprows=8, usecols=range(0,14), skipfooter=1)
+    data = [f.data for f in sync_files('shikoku', excel_urls, parse=read_excel,
+                                       metrics=('archive', 'Shikoku'))]
     data = pd.concat(data, ignore_index=True)
-    data = data.dropna().replace('－', np.nan)
+    with measure_stage('archive', 'Shikoku', 'transform') as counts:
+        data = data.dropna().replace('－', np.nan)
 
-    # combine date and time to a single column
-    data.iloc[:,0] = pd.to_datetime(data.iloc[:,0].astype(str) + ' ' + data.iloc[:,1].astype(str))
-    data.drop(data.columns[1], axis=1, inplace=True)
+        # combine date and time to a single column
+        data.iloc[:,0] = pd.to_datetime(data.iloc[:,0].astype(str) + ' ' + data.iloc[:,1].astype(str))
+        data.drop(data.columns[1], axis=1, inplace=True)
 
-    # column names
-    data.columns = ('Date_Time', 'Area_Demand', 'Nuclear Power', 'Thermal Power', 'Hydropower', 
-                    'Geothermal', 'Biomass', 'Solar Power', 'Solar Power Suppression', 'Wind Power',
-                    'Wind Power Suppression', 'Pumped Storage', 'Interconnector')
+        # column names
+        data.columns = ('Date_Time', 'Area_Demand', 'Nuclear Power', 'Thermal Power', 'Hydropower', 
+                        'Geothermal', 'Biomass', 'Solar Power', 'Solar Power Suppression', 'Wind Power',
+                        'Wind Power Suppression', 'Pumped Storage', 'Interconnector')
 
-    # convert from kWh to MWh
-    # assign units and region
-    data.loc[:,data.columns!='Date_Time'] = data.loc[:,data.columns!='Date_Time'] * 10
-    data['Region'], data['Unit'] = ['Shikoku', 'MWh']
+        # convert from kWh to MWh
+        # assign units and region
+        # columns holding placeholders are read as text, and text * 10 repeats the string
+        values = data.columns.drop('Date_Time')
+        data[values] = data[values].apply(pd.to_numeric, errors='coerce') * 10
+        data['Region'], data['Unit'] = ['Shikoku', 'MWh']
 
-    # get demand data
-    demand_df = data[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-    demand_df.sort_values(by=['Date_Time'],ascending=False, inplace=True)
+        # get demand data
+        demand_df = order_newest_first(data[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
 
-    # get supply data
-    data.drop('Area_Demand', axis=1, inplace=True)
-    supply_df = pd.melt(data, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-    supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
+        # get supply data, one column per fuel type
+        supply_df = to_wide_supply(data.drop('Area_Demand', axis=1))
+        if not wide:
+            supply_df = melt_supply(supply_df)
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
+    return demand_df, supply_df
+
+def download_data_to_csv(output_format='csv'):
+    """
+    This function downloads past demand/supply data, reformats data, and
+    reads demand data to one csv and supply data to another csv
+    :param output_format: 'csv' for the two csv files, 'parquet' for the partitioned dataset
+    """
+    demand_df, supply_df = read_shikoku_data()
+    write_archive(demand_df, supply_df, 'Shikoku', output_format)
 
-    # write demand and supply data to seperate csv files 
-    demand_df.to_csv('Japan_Shikoku_Demand_Data.csv', index=False)
-    supply_df.to_csv('Japan_Shikoku_Supply_Data.csv', index=False)
-    
 if __name__ == '__main__':
-    download_data_to_csv()
\ No newline at end of file
+    download_data_to_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv')
\ No newline at end of file
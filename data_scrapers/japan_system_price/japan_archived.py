@@ -1,70 +1,141 @@
-import requests
+# Downloads the JEPX spot market trading results of every fiscal year (2005 to
+# now) from http://www.jepx.org/english/market/index.html. The yearly csv
+# files are synced concurrently through japan_archive/archive_sync.py, so a
+# refresh only transfers the years that changed (in practice the current one),
+# and only the date, time code, system price and area price columns are parsed.
+# Time codes (30 minutes each, 1 to 48) are converted to a Date_Time column.
+# The data is written either to one csv per year or, with --parquet, to a
+# dataset partitioned by calendar year:
+#   JEPX_Price_Data/year=2021/part-spot_2021.parquet
+# With --incremental only the years whose file changed are written again.
+import os
+import sys
 import pandas as pd
 from bs4 import BeautifulSoup
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import COMPRESSION
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_system_price.price_join import to_timestamps
 
-def get_price_data():
-    """
-    This function downloads price data from 2022 back to 2005
-    in Spot Market Trading Results CSVs from the url,
-    clean the data, and reads to CSV files
+PRICE_DIR = 'JEPX_Price_Data'
 
-    Note: Time_code: Time zone every 30 minutes divided into 1 to 48
+# the twelve columns kept from the csv files, with their English names
+COLUMNS = {'年月日': 'Date',
+           '時刻コード': 'Time_code',
+           'システムプライス(円/kWh)': 'System price (yen/kWh)',
+           'エリアプライス北海道(円/kWh)': 'Area Price Hokkaido (yen/kWh)',
+           'エリアプライス東北(円/kWh)': 'Area Price Tohoku (yen/kWh)',
+           'エリアプライス東京(円/kWh)': 'Area Price Tokyo (yen/kWh)',
+           'エリアプライス中部(円/kWh)': 'Area Price Chubu (yen/kWh)',
+           'エリアプライス北陸(円/kWh)': 'Area Price Hokuriku (yen/kWh)',
+           'エリアプライス関西(円/kWh)': 'Area Price Kansai (yen/kWh)',
+           'エリアプライス中国(円/kWh)': 'Area Price Chūgoku (yen/kWh)',
+           'エリアプライス四国(円/kWh)': 'Area Price Shikoku (yen/kWh)',
+           'エリアプライス九州(円/kWh)': 'Area Price Kyushu (yen/kWh)'}
+
+def get_csv_urls():
+    """
+    This function gets the urls of the Spot Market Trading Results CSVs
+    :return: a list of csv urls, one per fiscal year
     """
     url = "http://www.jepx.org/english/market/index.html"
-    response = requests.get(url)
+    response = http_cache.get(url)
 
     # response.status_code is 200 if the website didn't block it
     # raise error if response.status_code != 200
-    if response.status_code != 200: 
+    if response.status_code != 200:
         raise Exception('Failed to load page {}'.format(url))
-    else:
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # get csv URLs for spot market trading results
-        trading_results_csv_url = []
-        for link in soup.find_all('a', {'class': 'arw'}):
-            relative_link_to_csv = link.get('href') # looks like "../../market/excel/spot_2022.csv"
-
-            # cut off "../../"
-            relative_link_to_csv = relative_link_to_csv[6:]
-
-            # combine "http://www.jepx.org" and relative_link_to_csv,
-            # add to trading_results_csv_url 
-            combined_url = "http://www.jepx.org/" + relative_link_to_csv
-
-            if "spot" in combined_url:
-                trading_results_csv_url.append(combined_url)
-
-        for i in range(len(trading_results_csv_url)):
-            df = pd.read_csv(trading_results_csv_url[i], encoding='shift-jis')
-
-            # drop columns other than date, time, system price and area price.
-            df = df[['年月日', '時刻コード', 'システムプライス(円/kWh)', 'エリアプライス北海道(円/kWh)',
-                   'エリアプライス東北(円/kWh)', 'エリアプライス東京(円/kWh)', 'エリアプライス中部(円/kWh)', 
-                   'エリアプライス北陸(円/kWh)', 'エリアプライス関西(円/kWh)', 'エリアプライス中国(円/kWh)',
-                   'エリアプライス四国(円/kWh)', 'エリアプライス九州(円/kWh)']]
-
-            # translate and rename columns
-            df.rename({'年月日': 'Date',
-                     '時刻コード': 'Time_code',
-                     'システムプライス(円/kWh)': 'System price (yen/kWh)',
-                     'エリアプライス北海道(円/kWh)': 'Area Price Hokkaido (yen/kWh)',
-                     'エリアプライス東北(円/kWh)': 'Area Price Tohoku (yen/kWh)', 
-                     'エリアプライス東京(円/kWh)': 'Area Price Tokyo (yen/kWh)',
-                     'エリアプライス中部(円/kWh)': 'Area Price Chubu (yen/kWh)', 
-                     'エリアプライス北陸(円/kWh)': 'Area Price Hokuriku (yen/kWh)', 
-                     'エリアプライス関西(円/kWh)': 'Area Price Kansai (yen/kWh)',
-                     'エリアプライス中国(円/kWh)': 'Area Price Chūgoku (yen/kWh)',
-                     'エリアプライス四国(円/kWh)': 'Area Price Shikoku (yen/kWh)', 
-                     'エリアプライス九州(円/kWh)': 'Area Price Kyushu (yen/kWh)'}, axis=1, inplace=True)
-
-            year = trading_results_csv_url[i].split("_")[1]
-            return df
-            
+    soup = BeautifulSoup(response.text, 'html.parser')
+
+    # get csv URLs for spot market trading results
+    trading_results_csv_url = []
+    for link in soup.find_all('a', {'class': 'arw'}):
+        relative_link_to_csv = link.get('href') # looks like "../../market/excel/spot_2022.csv"
+
+        # cut off "../../"
+        relative_link_to_csv = relative_link_to_csv[6:]
+
+        # combine "http://www.jepx.org" and relative_link_to_csv,
+        # add to trading_results_csv_url
+        combined_url = "http://www.jepx.org/" + relative_link_to_csv
+
+        if "spot" in combined_url:
+            trading_results_csv_url.append(combined_url)
+    return trading_results_csv_url
+
+def read_spot_csv(path):
+    """
+    Reads the twelve needed columns of a spot market csv.
+    Note: Time_code: Time zone every 30 minutes divided into 1 to 48
+    :param path: path or url of a spot_<year>.csv file
+    :return: df with the translated columns and a Date_Time column, prices as float32
+    """
+    df = pd.read_csv(path, encoding='shift-jis', usecols=list(COLUMNS))
+    # translate and rename columns, keeping the order of COLUMNS
+    df = df[list(COLUMNS)].rename(columns=COLUMNS)
+    df = df.dropna(subset=['Date', 'Time_code'])
+    df['Time_code'] = df['Time_code'].astype('int8')
+    prices = list(COLUMNS.values())[2:]
+    df[prices] = df[prices].apply(pd.to_numeric, errors='coerce').astype('float32')
+    df.insert(0, 'Date_Time', to_timestamps(df['Date'], df['Time_code']))
+    return df
+
+def write_price_partitions(df, name, price_dir=PRICE_DIR):
+    """
+    Writes one file per calendar year partition, replacing the file written
+    earlier for the same name.
+    :param df: df from read_spot_csv
+    :param name: name of the source file, e.g. 'spot_2021'
+    :param price_dir: root folder of the dataset
+    """
+    for year, year_df in df.groupby(df['Date_Time'].dt.year):
+        partition = os.path.join(price_dir, 'year={}'.format(year))
+        os.makedirs(partition, exist_ok=True)
+        year_df.to_parquet(os.path.join(partition, 'part-{}.parquet'.format(name)),
+                           index=False, compression=COMPRESSION)
+
+def read_price_data(year=None, price_dir=PRICE_DIR):
+    """
+    :param year: only read this calendar year's partition, None for every year
+    :param price_dir: root folder of the dataset
+    :return: df of the prices, sorted by Date_Time
+    """
+    path = price_dir if year is None else os.path.join(price_dir, 'year={}'.format(year))
+    df = pd.read_parquet(path)
+    df = df.drop(columns=[c for c in ('year',) if c in df.columns])
+    return df.sort_values(by='Date_Time', kind='stable', ignore_index=True)
+
+def get_price_data(output_format='csv', incremental=False):
+    """
+    This function downloads price data from 2005 to now in Spot Market
+    Trading Results CSVs from the url, cleans the data, and writes it to CSV
+    files or the Parquet dataset.
+    :param output_format: 'csv' for one csv per year, 'parquet' for the partitioned dataset
+    :param incremental: only write the years whose file is new or changed since the last run
+    :return: df of every year that was written, sorted by Date_Time
+    """
+    csv_urls = get_csv_urls()
+
+    written = []
+    for url, path, changed, data in sync_files('jepx', csv_urls, metrics=('prices', 'JEPX_Archive')):
+        if incremental and not changed:
+            continue
+        df = read_spot_csv(path)
+        name = os.path.splitext(os.path.basename(url))[0]
+        if output_format == 'parquet':
+            write_price_partitions(df, name)
+        else:
+            year = url.split("_")[1]
             df.to_csv('Spot_Market_Trading_Results_Price_{}'.format(year), index=False)
+        written.append(df)
+
+    if not written:
+        return pd.DataFrame(columns=['Date_Time'] + list(COLUMNS.values()))
+    return pd.concat(written, ignore_index=True).sort_values(by='Date_Time', kind='stable', ignore_index=True)
 
-def main():
-    get_price_data()
+def main(output_format='csv', incremental=False):
+    get_price_data(output_format, incremental)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main('parquet' if '--parquet' in sys.argv[1:] else 'csv',
+         incremental='--incremental' in sys.argv[1:])
@@ -1,38 +1,105 @@
-import requests
-import pandas as pd
+# Scrapes the latest day of system price and area price data from
+# http://www.jepx.org/english/market/index.html. The yearly spot csv grows to
+# several MB, so instead of downloading it for 48 rows only its first line
+# (the header) and its last few KB are requested with HTTP Range requests.
+# If the server ignores the Range header, or the tail does not hold the whole
+# last day, the full file is used instead.
+import csv
+import io
 import os
 from datetime import datetime
+from data_scrapers import http_cache
+from data_scrapers.japan_system_price.japan_archived import COLUMNS, read_spot_csv
 
-def get_latest_data():
+# 48 rows of the spot csv are about 10 KB
+TAIL_BYTES = 32 * 1024
+HEADER_BYTES = 4 * 1024
+ROWS_PER_DAY = 48
+
+def fetch_range(session, url, byte_range):
+    """
+    :param session: http_cache module or a requests.Session
+    :param url: url of the spot csv
+    :param byte_range: value of the Range header, e.g. 'bytes=-32768'
+    :return: a tuple (content, partial); partial is False if the server sent the whole file
+    """
+    r = session.get(url, headers={'Range': byte_range})
+    if r.status_code == 206:
+        return r.content, True
+    if r.status_code != 200:
+        raise Exception('Failed to load page {}'.format(url))
+    return r.content, False
+
+def fetch_last_day(session, url):
+    """
+    Fetches the header line and the rows of the last day in the spot csv.
+    :param session: http_cache module or a requests.Session
+    :param url: url of the spot csv
+    :return: csv content (bytes) with the header line and at least the last day's rows
+    """
+    tail, partial = fetch_range(session, url, 'bytes=-{}'.format(TAIL_BYTES))
+    if not partial:
+        return tail
+    head, partial = fetch_range(session, url, 'bytes=0-{}'.format(HEADER_BYTES - 1))
+    if not partial:
+        return head
+    # the first line of the tail is usually cut off; a newline byte never occurs
+    # inside a Shift-JIS character, so splitting the bytes is safe
+    header = head.split(b'\n', 1)[0].rstrip(b'\r')
+    rows = tail.split(b'\n', 1)[1] if b'\n' in tail else b''
+    return header + b'\n' + rows
+
+def get_stored_dates(csv_file, tail_bytes=TAIL_BYTES):
+    """
+    :param csv_file: path of the local Spot_Market_Trading_Results_Price_<year>.csv
+    :param tail_bytes: number of bytes read from the end of the file
+    :return: a tuple (fieldnames, dates) of the file's header and the dates of
+             its last rows; (None, set()) if the file does not exist
+    """
+    if not os.path.isfile(csv_file):
+        return None, set()
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        fieldnames = next(csv.reader(f))
+    with open(csv_file, 'rb') as f:
+        f.seek(max(os.path.getsize(csv_file) - tail_bytes, 0))
+        lines = f.read().decode('utf-8', errors='replace').splitlines()[1:]
+    date_column = fieldnames.index('Date')
+    dates = {row[date_column] for row in csv.reader(lines) if len(row) == len(fieldnames)}
+    return fieldnames, dates
+
+def get_latest_data(session=http_cache):
     """
-    Function for scraping daily system price and area price data from CSV file 
+    Function for scraping daily system price and area price data from CSV file
     from http://www.jepx.org/english/market/index.html.
     Writes daily data to a csv file. If the csv already exists, append new
-    data to it, otherwise create new csv with new data.
+    data to it, otherwise create new csv with new data. A day that is
+    already in the csv is not appended again.
+    :param session: http_cache module or a requests.Session
+    :return: number of rows written
     """
     currentYear = datetime.now().year
     url = 'http://www.jepx.org/market/excel/spot_{}.csv'.format(currentYear)
-    r = requests.get(url)
-    if r.status_code != 200:
-        raise Exception('Failed to load page {}'.format(url))
-        
-    df = pd.read_csv(url, encoding='shift-jis').tail(48)
-    df = df[['年月日', '時刻コード', 'システムプライス(円/kWh)',
-             'エリアプライス北海道(円/kWh)', 'エリアプライス東北(円/kWh)',
-             'エリアプライス東京(円/kWh)', 'エリアプライス中部(円/kWh)',
-             'エリアプライス北陸(円/kWh)', 'エリアプライス関西(円/kWh)',
-             'エリアプライス中国(円/kWh)', 'エリアプライス四国(円/kWh)',
-             'エリアプライス九州(円/kWh)']]
-    
-    df.columns  = ('Date', 'Time_code', 'System price (yen/kWh)',
-                   'Area Price Hokkaido (yen/kWh)', 'Area Price Tohoku (yen/kWh)',
-                   'Area Price Tokyo (yen/kWh)', 'Area Price Chubu (yen/kWh)',
-                   'Area Price Hokuriku (yen/kWh)', 'Area Price Kansai (yen/kWh)',
-                   'Area Price Chūgoku (yen/kWh)', 'Area Price Shikoku (yen/kWh)',
-                   'Area Price Kyushu (yen/kWh)')
+
+    df = read_spot_csv(io.BytesIO(fetch_last_day(session, url)))
+    df = df[df['Date'] == df['Date'].iloc[-1]]
+    if len(df) < ROWS_PER_DAY:
+        # the tail did not hold the whole day
+        r = session.get(url)
+        if r.status_code != 200:
+            raise Exception('Failed to load page {}'.format(url))
+        df = read_spot_csv(io.BytesIO(r.content)).tail(ROWS_PER_DAY)
 
     csv_file = 'Spot_Market_Trading_Results_Price_{}.csv'.format(currentYear)
-    df.to_csv(csv_file, mode='a', header=not os.path.exists(csv_file))
-            
+    fieldnames, dates = get_stored_dates(csv_file)
+    if df['Date'].iloc[-1] in dates:
+        return 0
+    if fieldnames is None:
+        fieldnames = ['Date_Time'] + list(COLUMNS.values())
+        df.to_csv(csv_file, index=False, columns=fieldnames)
+    else:
+        # keep the layout of the existing file
+        df.reindex(columns=fieldnames).to_csv(csv_file, mode='a', header=False, index=False)
+    return len(df)
+
 if __name__ == '__main__':
-    get_latest_data()
\ No newline at end of file
+    get_latest_data()
@@ -0,0 +1,144 @@
+# Joins JEPX spot prices to the hourly regional data. JEPX publishes one row
+# per day and 30-minute time code (1 = 00:00-00:30, ..., 48 = 23:30-24:00),
+# while the regional loaders produce hourly Date_Time rows. The prices are
+# converted once into a price index: a sorted, unique half-hourly
+# DatetimeIndex with one column per region (and the system price), saved as
+# Parquet so repeated joins over the whole price history neither re-parse the
+# csv files nor re-sort. A join looks up every row's region column and the last
+# price at or before its Date_Time with one searchsorted call.
+# Run from the folder holding the Spot_Market_Trading_Results_Price_* csv files:
+#   python -m data_scrapers.japan_system_price.price_join
+import glob
+import sys
+import numpy as np
+import pandas as pd
+
+# region name of the regional loaders -> price column of the JEPX csv files
+AREA_PRICE_COLUMNS = {
+    'Hokkaido': 'Area Price Hokkaido (yen/kWh)',
+    'Tohoku': 'Area Price Tohoku (yen/kWh)',
+    'Tokyo': 'Area Price Tokyo (yen/kWh)',
+    'Chubu': 'Area Price Chubu (yen/kWh)',
+    'Hokuriku': 'Area Price Hokuriku (yen/kWh)',
+    'Kansai': 'Area Price Kansai (yen/kWh)',
+    'Chugoku': 'Area Price Chūgoku (yen/kWh)',
+    'Shikoku': 'Area Price Shikoku (yen/kWh)',
+    'Kyushu': 'Area Price Kyushu (yen/kWh)',
+}
+SYSTEM_PRICE_COLUMN = 'System price (yen/kWh)'
+INDEX_FILE = 'JEPX_Price_Index.parquet'
+# a row further than this from the last price gets no price
+TOLERANCE = pd.Timedelta(hours=1)
+
+def to_timestamps(dates, time_codes):
+    """
+    :param dates: Series of dates as in the JEPX csv files, e.g. '2022/04/01'
+    :param time_codes: Series of 30-minute time codes, 1 to 48
+    :return: DatetimeIndex of the start of every time code
+    """
+    dates = pd.DatetimeIndex(pd.to_datetime(dates, format='%Y/%m/%d'))
+    offsets = pd.to_timedelta((pd.to_numeric(time_codes).to_numpy(dtype='int64') - 1) * 30, unit='min')
+    return pd.DatetimeIndex(dates + offsets, name='Date_Time')
+
+def build_price_index(price_df):
+    """
+    :param price_df: JEPX prices with the columns of japan_archived.get_price_data
+                     (Date, Time_code, system and area prices), any row order
+    :return: dataframe indexed by the sorted, unique start time of every time
+             code, with one float64 price column per region and a System column
+    """
+    columns = dict(AREA_PRICE_COLUMNS, System=SYSTEM_PRICE_COLUMN)
+    price_index = pd.DataFrame({region: pd.to_numeric(price_df[column], errors='coerce').to_numpy()
+                                for region, column in columns.items()},
+                               index=to_timestamps(price_df['Date'], price_df['Time_code']))
+    # a day published again (e.g. by the daily scraper) keeps its last row
+    price_index = price_index[~price_index.index.duplicated(keep='last')]
+    if not price_index.index.is_monotonic_increasing:
+        price_index = price_index.sort_index()
+    return price_index
+
+def read_price_csvs(paths):
+    """
+    :param paths: paths of Spot_Market_Trading_Results_Price_* csv files
+    :return: a price index built from all files
+    """
+    return build_price_index(pd.concat([pd.read_csv(path) for path in paths], ignore_index=True))
+
+def save_price_index(price_index, path=INDEX_FILE):
+    """
+    :param price_index: price index from build_price_index
+    :param path: Parquet file to write
+    """
+    price_index.to_parquet(path)
+
+def load_price_index(path=INDEX_FILE):
+    """
+    :param path: Parquet file written by save_price_index
+    :return: the half-hourly price index
+    """
+    return pd.read_parquet(path)
+
+def to_hourly(price_index):
+    """
+    :param price_index: half-hourly price index
+    :return: price index with the mean of the two time codes of every hour
+    """
+    return price_index.groupby(price_index.index.floor('h')).mean().rename_axis('Date_Time')
+
+def lookup_prices(price_index, date_times, regions, tolerance=TOLERANCE):
+    """
+    As-of lookup of the price in effect at every row.
+    :param price_index: half-hourly or hourly price index
+    :param date_times: DatetimeIndex or Series of the rows' times
+    :param regions: array of the rows' region names (or 'System')
+    :param tolerance: rows further than this from the last price get NaN
+    :return: float64 numpy array with one price per row
+    """
+    times = price_index.index.to_numpy()
+    date_times = pd.DatetimeIndex(date_times).to_numpy().astype(times.dtype)
+    rows = np.searchsorted(times, date_times, side='right') - 1
+    columns = price_index.columns.get_indexer(np.asarray(regions))
+    found = (rows >= 0) & (columns >= 0)
+    prices = np.full(len(date_times), np.nan)
+    prices[found] = price_index.to_numpy(dtype='float64')[rows[found], columns[found]]
+    too_far = found & (date_times - times[np.maximum(rows, 0)] > tolerance.to_timedelta64())
+    prices[too_far] = np.nan
+    return prices
+
+def join_prices(df, price_index, hourly=True, tolerance=TOLERANCE):
+    """
+    Adds the area price of every row's region and time.
+    :param df: dataframe indexed by (Date_Time, Region), e.g. the national
+               demand table, or with Date_Time and Region columns
+    :param price_index: half-hourly price index from build_price_index
+    :param hourly: use the hourly mean of the two time codes (for hourly data)
+                   instead of the price of the time code the hour starts in
+    :param tolerance: rows further than this from the last price get NaN
+    :return: a copy of df with a Price (yen/kWh) column
+    """
+    if hourly:
+        price_index = to_hourly(price_index)
+    keys = df.index.to_frame(index=False) if 'Region' in df.index.names else df
+    df = df.copy()
+    df['Price'] = lookup_prices(price_index, keys['Date_Time'], keys['Region'].astype(str), tolerance)
+    return df
+
+def price_weighted(joined, value_column, freq='D'):
+    """
+    Volume-weighted view of a joined table.
+    :param joined: output of join_prices, indexed by (Date_Time, Region)
+    :param value_column: the energy column in MWh, e.g. 'Area_Demand'
+    :param freq: pandas frequency of the periods, e.g. 'D' or 'MS'
+    :return: dataframe indexed by (Date_Time, Region) with the energy (MWh),
+             cost (yen) and weighted average price (yen/kWh) of every period
+    """
+    energy = joined[value_column].astype('float64').where(joined['Price'].notna())
+    frame = pd.DataFrame({'Energy': energy, 'Cost': energy * 1000 * joined['Price']})
+    periods = frame.groupby([pd.Grouper(level='Date_Time', freq=freq), pd.Grouper(level='Region')],
+                            observed=True).sum()
+    periods['Weighted_Price'] = (periods['Cost'] / (periods['Energy'] * 1000)).where(periods['Energy'] > 0)
+    return periods
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or sorted(glob.glob('Spot_Market_Trading_Results_Price_*'))
+    save_price_index(read_price_csvs(paths))
@@ -3,9 +3,15 @@
 # Converts all demand and supply values from 10,000 kWh to MWh and reads 
 # formatted data to two csv files: one for demand data and one for supply
 
-import requests
+import sys
+from functools import partial
 import pandas as pd
 from bs4 import BeautifulSoup
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import compact, write_archive
+from data_scrapers.japan_archive.archive_sync import sync_files
+from data_scrapers.japan_archive.wide_supply import melt_supply, order_newest_first, to_wide_supply
+from data_scrapers.scrape_metrics import measure_stage
 
 def get_csv_urls():
     """
@@ -14,7 +20,7 @@ def get_csv_urls():
     :return: a list of CSV urls
     """
     url = 'https://setsuden.nw.tohoku-epco.co.jp/download.html'
-    r = requests.get(url)
+    r = http_cache.get(url)
     if r.status_code != 200:
         raise Exception('Failed to load page {}'.format(url))
     page = BeautifulSoup(r.text, 'html.parser')
@@ -29,50 +35,63 @@ def get_csv_urls():
         
     return link_urls
 
-def download_csv():
+def read_tohoku_data(wide=False):
     """
-    This is the main function for downloading supply/demand data from CSV urls,
-    cleaning and formatting data. Then, reading demand data to one CSV file 
-    and supply data to another CSV file.
+    This function downloads supply/demand data from CSV urls, cleans and
+    formats the data.
+    :param wide: return supply data with one column per fuel type, indexed by
+                 Date_Time in chronological order, see wide_supply.iter_supply
+    :return: a tuple (demand_df, supply_df), most recent data first
     """
     csv_urls = get_csv_urls()
 
-    # read all csvs, concat into a single df
-    data = [pd.read_csv(url, encoding= 'unicode_escape', parse_dates=['DATE_TIME']) for url in csv_urls]
+    # download new or changed csvs concurrently, read all local copies, concat into a single df
+    read_csv = partial(pd.read_csv, encoding= 'unicode_escape', parse_dates=['DATE_TIME'])
+    data = [f.data for f in sync_files('tohoku', csv_urls, parse=read_csv,
+                                       metrics=('archive', 'Tohoku'))]
     data = pd.concat(data, ignore_index=True)
-    
-    # rename columns
-    data.columns = ['Date_Time', 
-                    'Area_Demand', 
-                    'Hydropower', 
-                    'Thermal Power', 
-                    'Nuclear Power', 
-                    'Solar Power', 
-                    'Solar Power Suppression', 
-                    'Wind Power', 
-                    'Wind Power Suppression', 
-                    'Geothermal', 
-                    'Biomass', 
-                    'Pumped Storage', 
-                    'Interconnector']
 
-    # convert from kWh to MWh
-    # assign units and region
-    data.loc[:,data.columns!='Date_Time'] = data.loc[:,data.columns!='Date_Time'] * 10
-    data['Region'], data['Unit'] = ['Tohoku', 'MWh']
+    with measure_stage('archive', 'Tohoku', 'transform') as counts:
+        # rename columns
+        data.columns = ['Date_Time', 
+                        'Area_Demand', 
+                        'Hydropower', 
+                        'Thermal Power', 
+                        'Nuclear Power', 
+                        'Solar Power', 
+                        'Solar Power Suppression', 
+                        'Wind Power', 
+                        'Wind Power Suppression', 
+                        'Geothermal', 
+                        'Biomass', 
+                        'Pumped Storage', 
+                        'Interconnector']
 
-    # get demand data into one df
-    demand_df = data[['Date_Time', 'Region', 'Unit', 'Area_Demand']].copy()
-    demand_df.sort_values(by=['Date_Time'],ascending=False, inplace=True)
+        # convert from kWh to MWh
+        # assign units and region
+        data.loc[:,data.columns!='Date_Time'] = data.loc[:,data.columns!='Date_Time'] * 10
+        data['Region'], data['Unit'] = ['Tohoku', 'MWh']
+
+        # get demand data into one df
+        demand_df = order_newest_first(data[['Date_Time', 'Region', 'Unit', 'Area_Demand']])
+
+        # get supply data into one df, one column per fuel type
+        supply_df = to_wide_supply(data.drop('Area_Demand', axis=1))
+        if not wide:
+            supply_df = melt_supply(supply_df)
+        demand_df = compact(demand_df, 'Area_Demand')
+        counts['rows'] = len(demand_df) + len(supply_df)
+    return demand_df, supply_df
+
+def download_csv(output_format='csv'):
+    """
+    This is the main function for downloading supply/demand data from CSV urls,
+    cleaning and formatting data. Then, reading demand data to one CSV file 
+    and supply data to another CSV file.
+    :param output_format: 'csv' for the two csv files, 'parquet' for the partitioned dataset
+    """
+    demand_df, supply_df = read_tohoku_data()
+    write_archive(demand_df, supply_df, 'Tohoku', output_format)
 
-    # get supply data into one df
-    data.drop('Area_Demand', axis=1, inplace=True)
-    supply_df = pd.melt(data, id_vars=['Date_Time','Region', 'Unit'], var_name='Fuel_Type', value_name='Supply')
-    supply_df.sort_values(by=['Date_Time','Fuel_Type'], ascending=False, inplace=True)
-    
-    # write demand and supply data to seperate csv files 
-    demand_df.to_csv('Japan_Tohoku_Demand_Data.csv', index=False)
-    supply_df.to_csv('Japan_Tohoku_Supply_Data.csv', index=False) 
-    
 if __name__ == '__main__':
-    download_csv()
\ No newline at end of file
+    download_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv')
\ No newline at end of file
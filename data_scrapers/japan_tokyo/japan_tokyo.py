@@ -4,9 +4,13 @@
 # formatted data to csv files. Each year's data will be downloaded
 # to a separate csv file labeled by the corresponding year.
 
-import requests
+import io
+import sys
 import pandas as pd
 from bs4 import BeautifulSoup
+from data_scrapers import http_cache
+from data_scrapers.japan_archive.archive_output import compact, write_parquet
+from data_scrapers.scrape_metrics import measure_stage
 
 def get_page():
     """
@@ -14,7 +18,7 @@ def get_page():
     :return: BeautifulSoup object of HTML source codes
     """ 
     url = 'https://www.tepco.co.jp/en/forecast/html/download-e.html'
-    r = requests.get(url)
+    r = http_cache.get(url)
     if r.status_code != 200:
         r.raise_for_status()
     page = BeautifulSoup(r.text, "html.parser")
@@ -33,29 +37,69 @@ def get_csv_urls(page):
             csv_urls.append(base_url + anchor['href'])
     return csv_urls
 
-def download_csv():
+def read_tokyo_files():
     """
-    This function downloads CSV's from the url, cleans and formats the data,
-    and reads to CSV files
+    This function downloads CSV's from the url, cleans and formats the data
+    :return: a generator of tuples (file name, demand df), one per year
     """
     page = get_page()
     csv_urls = get_csv_urls(page)
     
     for url in csv_urls: 
-        df = pd.read_csv(url, encoding= 'unicode_escape', header=1, parse_dates=[['DATE', 'TIME']])
+        with measure_stage('archive', 'Tokyo', 'fetch') as counts:
+            r = http_cache.get(url)
+            counts.update(status=r.status_code, bytes=len(r.content))
+            if r.status_code != 200:
+                raise Exception('Failed to load page {}'.format(url))
+        with measure_stage('archive', 'Tokyo', 'parse') as counts:
+            df = pd.read_csv(io.BytesIO(r.content), encoding= 'unicode_escape', header=1)
+            counts.update(bytes=len(r.content), rows=len(df))
 
-        # rename columns, add columns for region and unit
-        df.columns = ('Date_Time', 'Demand')
-        df['Region'], df['Unit'] = ['Tokyo', 'MW']
-        
-        # convert from 10,000kW to MW
-        df.Demand = df.Demand * 10
-        
-        # sort by datetime so that most recent data appears up top
+        with measure_stage('archive', 'Tokyo', 'transform') as counts:
+            # combine columns 'DATE' and 'TIME' to make a datetime object
+            # (pandas no longer combines columns through parse_dates)
+            df['DATE'] = pd.to_datetime(df.DATE + ' ' + df.TIME, format='%Y/%m/%d %H:%M')
+            df.drop('TIME', axis=1, inplace=True)
+
+            # rename columns, add columns for region and unit
+            df.columns = ('Date_Time', 'Demand')
+            df['Region'], df['Unit'] = ['Tokyo', 'MW']
+
+            # convert from 10,000kW to MW
+            df.Demand = df.Demand * 10
+
+            # sort by datetime so that most recent data appears up top
+            df.sort_values(by='Date_Time',ascending=False, inplace=True)
+            df = compact(df, 'Demand')
+            counts['rows'] = len(df)
+        yield url[-8:], df
+
+def read_tokyo_data():
+    """
+    :return: demand df of all years combined, most recent data first
+    """
+    files = list(read_tokyo_files())
+    with measure_stage('archive', 'Tokyo', 'transform') as counts:
+        df = pd.concat([df for name, df in files], ignore_index=True)
         df.sort_values(by='Date_Time',ascending=False, inplace=True)
+        df = compact(df, 'Demand')
+        counts['rows'] = len(df)
+    return df
 
+def download_csv(output_format='csv'):
+    """
+    This function downloads CSV's from the url, cleans and formats the data,
+    and reads to CSV files
+    :param output_format: 'csv' for one csv per year, 'parquet' for the partitioned dataset
+    """
+    for name, df in read_tokyo_files():
         # write each year's df to csv
-        df.to_csv('Tokyo_{}'.format(url[-8:]), index=False)
+        with measure_stage('archive', 'Tokyo', 'write') as counts:
+            if output_format == 'parquet':
+                write_parquet(df.rename(columns={'Demand': 'Area_Demand'}), None, 'Tokyo', name)
+            else:
+                df.to_csv('Tokyo_{}'.format(name), index=False)
+            counts['rows'] = len(df)
         
 if __name__ == '__main__':
-    download_csv()
\ No newline at end of file
+    download_csv('parquet' if '--parquet' in sys.argv[1:] else 'csv')
\ No newline at end of file
@@ -0,0 +1,177 @@
+# Per-stage metrics of the scrapers. A slow or stuck utility host used to show
+# up only as missing data, so the scrapers wrap each stage of a run in
+# measure_stage(), which records how long it took, the bytes and rows it
+# handled, the HTTP status of a download and the error it raised, if any:
+#   fetch:     downloading a page or file (status and bytes of the response)
+#   parse:     decoding and parsing downloaded files into tables (bytes and rows)
+#   transform: reshaping the tables into the output format (melt, sort, format_rows)
+#   write:     writing csv or Parquet output (rows)
+# A run that fails outside every stage (e.g. in a landing page lookup, or a
+# worker process that dies) is recorded by record_failure as a 'run' stage, so
+# the run is still reported as failed.
+# The files are decoded by the parsers themselves (read_csv with an encoding,
+# or the byte-level realtime parser), so decoding is part of the parse stage.
+# Records are kept per process until they are exported with write_metrics:
+#   *.prom:     a Prometheus textfile for node_exporter's textfile collector,
+#               replaced atomically, with the latest run of every source
+#   otherwise:  one JSON object per stage appended to the file
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+STAGES = ['fetch', 'parse', 'transform', 'write']
+PROMETHEUS_PREFIX = 'scraper'
+
+# scraper: 'archive', 'realtime' or 'prices', as the modes of python -m data_scrapers
+# source: the region or price source, e.g. 'Kyushu'
+# bytes, rows, status: None where they do not apply to the stage
+# error: the exception class name if the stage failed, None otherwise
+# timestamp: unix time the stage finished
+StageRecord = namedtuple('StageRecord', ['scraper', 'source', 'stage', 'seconds', 'bytes',
+                                         'rows', 'status', 'error', 'timestamp'])
+
+# records not exported yet; the poller measures several regions on threads
+RECORDS = []
+RECORDS_LOCK = threading.Lock()
+# (scraper, source) -> summary of its latest exported run, for the Prometheus textfile
+LATEST_RUNS = {}
+WRITE_LOCK = threading.Lock()
+
+@contextmanager
+def measure_stage(scraper, source, stage):
+    """
+    Records the duration of the enclosed block as one stage of a run. The
+    block fills in the counts it knows, e.g. counts['rows'] = len(df). A
+    stage that raises is recorded with the exception's name and re-raised.
+    :param scraper: 'archive', 'realtime' or 'prices'
+    :param source: the region or price source
+    :param stage: one of STAGES
+    :return: (yields) dictionary with bytes, rows and status, None until set
+    """
+    counts = {'bytes': None, 'rows': None, 'status': None}
+    error = None
+    start = time.monotonic()
+    try:
+        yield counts
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = StageRecord(scraper, source, stage, time.monotonic() - start, counts['bytes'],
+                             counts['rows'], counts['status'], error, time.time())
+        with RECORDS_LOCK:
+            RECORDS.append(record)
+
+def record_failure(scraper, source, error, seconds=0.0):
+    """
+    Records a failed run of a source as a 'run' stage, for the errors the
+    caller catches around the whole run; errors raised inside measure_stage
+    are recorded by their stage too.
+    :param scraper: 'archive', 'realtime' or 'prices'
+    :param source: the region or price source
+    :param error: the exception the run failed with
+    :param seconds: duration of the run until it failed
+    """
+    record = StageRecord(scraper, source, 'run', seconds, None, None, None,
+                         type(error).__name__, time.time())
+    with RECORDS_LOCK:
+        RECORDS.append(record)
+
+def pop_records(source=None):
+    """
+    Removes the recorded stages from the process, so they are exported once.
+    :param source: only pop the stages of this source, None for every source
+    :return: list of StageRecords in the order they finished
+    """
+    with RECORDS_LOCK:
+        records = [r for r in RECORDS if source is None or r.source == source]
+        RECORDS[:] = [r for r in RECORDS if source is not None and r.source != source]
+    return records
+
+def summarize(records):
+    """
+    Adds up the records of a run per stage. Stages that ran more than once,
+    e.g. the download of every archive file, are summed; files downloaded on
+    a thread pool can therefore add up to more than the wall time.
+    :param records: list of StageRecords
+    :return: dictionary of (scraper, source) -> run summary with the run's
+             timestamp, whether it succeeded, and a dictionary of stage ->
+             calls, seconds, bytes, rows, errors and the last HTTP status
+             (bytes, rows and status are None if the stage never reported them)
+    """
+    runs = {}
+    for record in records:
+        run = runs.setdefault((record.scraper, record.source),
+                              {'timestamp': record.timestamp, 'success': True, 'stages': {}})
+        stage = run['stages'].setdefault(record.stage, {'calls': 0, 'seconds': 0.0, 'bytes': None,
+                                                        'rows': None, 'errors': 0, 'status': None})
+        stage['calls'] += 1
+        stage['seconds'] += record.seconds
+        for key in ('bytes', 'rows'):
+            if getattr(record, key) is not None:
+                stage[key] = (stage[key] or 0) + getattr(record, key)
+        if record.status is not None:
+            stage['status'] = record.status
+        if record.error is not None:
+            stage['errors'] += 1
+            run['success'] = False
+        run['timestamp'] = max(run['timestamp'], record.timestamp)
+    return runs
+
+def format_prometheus(runs):
+    """
+    :param runs: dictionary returned by summarize
+    :return: the runs in the Prometheus text exposition format
+    """
+    # (metric, help, value of a stage summary)
+    stage_metrics = [('stage_duration_seconds', 'Time spent in the stage during the last run.', 'seconds'),
+                     ('stage_bytes', 'Bytes handled by the stage during the last run.', 'bytes'),
+                     ('stage_rows', 'Rows handled by the stage during the last run.', 'rows'),
+                     ('stage_calls', 'Number of times the stage ran during the last run.', 'calls'),
+                     ('stage_errors', 'Number of times the stage failed during the last run.', 'errors'),
+                     ('http_status', 'HTTP status of the last response of the stage.', 'status')]
+    lines = []
+    for name, help_text, key in stage_metrics:
+        lines += ['# HELP {}_{} {}'.format(PROMETHEUS_PREFIX, name, help_text),
+                  '# TYPE {}_{} gauge'.format(PROMETHEUS_PREFIX, name)]
+        for (scraper, source), run in sorted(runs.items()):
+            for stage, summary in run['stages'].items():
+                if summary[key] is None:
+                    continue
+                lines.append('{}_{}{{scraper="{}",source="{}",stage="{}"}} {}'.format(
+                    PROMETHEUS_PREFIX, name, scraper, source, stage, summary[key]))
+
+    run_metrics = [('last_run_timestamp_seconds', 'Unix time the last run finished.',
+                    lambda run: '{:.3f}'.format(run['timestamp'])),
+                   ('last_run_success', '1 if no stage of the last run failed, 0 otherwise.',
+                    lambda run: int(run['success']))]
+    for name, help_text, get_value in run_metrics:
+        lines += ['# HELP {}_{} {}'.format(PROMETHEUS_PREFIX, name, help_text),
+                  '# TYPE {}_{} gauge'.format(PROMETHEUS_PREFIX, name)]
+        for (scraper, source), run in sorted(runs.items()):
+            lines.append('{}_{}{{scraper="{}",source="{}"}} {}'.format(
+                PROMETHEUS_PREFIX, name, scraper, source, get_value(run)))
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(path, records):
+    """
+    Exports the records of a run. A Prometheus textfile (*.prom) keeps the
+    latest run of every source this process has exported, so regions polled
+    separately all stay in the file; any other path gets one JSON line per stage.
+    :param path: path of the metrics file
+    :param records: list of StageRecords, see pop_records
+    """
+    with WRITE_LOCK:
+        if path.endswith('.prom'):
+            LATEST_RUNS.update(summarize(records))
+            # the collector may read the file at any time, so it is replaced atomically
+            with open(path + '.tmp', 'w') as f:
+                f.write(format_prometheus(LATEST_RUNS))
+            os.replace(path + '.tmp', path)
+        else:
+            with open(path, 'a') as f:
+                for record in records:
+                    f.write(json.dumps(record._asdict()) + '\n')
@@ -0,0 +1,62 @@
+# Local stand-in for the NLDC load chart endpoint, serving responses recorded
+# with vietnam_realtime_scraper.py --record DIR (one <YYYY-MM-DD>.json file per
+# day). Days without a recording return 404. Used to run the scraper without
+# reaching the NLDC website. It replays the client's own recordings, so it does
+# not check that the client's (unverified) contract matches the real endpoint:
+#   python -m data_scrapers.vietnam.nldc_stand_in_server DIR --port 8800
+#   python -m data_scrapers.vietnam.vietnam_realtime_scraper --base-url http://localhost:8800
+import argparse
+import os
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from data_scrapers.vietnam.vietnam_realtime_scraper import DATE_PARAM, DAY_PATH
+
+def make_handler(record_dir):
+    """
+    :param record_dir: folder of the recorded responses
+    :return: a request handler class serving the folder
+    """
+    class RecordedResponseHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            day = parse_qs(url.query).get(DATE_PARAM, [''])[0]
+            try:
+                day = datetime.strptime(day, '%d/%m/%Y').date()
+            except ValueError:
+                day = None
+            path = os.path.join(record_dir, day.isoformat() + '.json') if day else None
+            if url.path != DAY_PATH or path is None or not os.path.isfile(path):
+                self.send_error(404)
+                return
+            with open(path, 'rb') as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RecordedResponseHandler
+
+def start_server(record_dir, port=0):
+    """
+    Starts the stand-in server on a background thread.
+    :param record_dir: folder of the recorded responses
+    :param port: port to listen on, 0 for any free port
+    :return: the running server; its base url is 'http://localhost:<server.server_port>'
+    """
+    server = ThreadingHTTPServer(('localhost', port), make_handler(record_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve recorded NLDC responses.')
+    parser.add_argument('record_dir', help='folder of the recorded responses')
+    parser.add_argument('--port', type=int, default=8800)
+    args = parser.parse_args()
+    ThreadingHTTPServer(('localhost', args.port), make_handler(args.record_dir)).serve_forever()
@@ -2,13 +2,24 @@
 # Generation is converted from millions of kWh to MWh 
 # PDF files were manually downloaded into the 'Vietnam_data' folder, may 
 # need to change directory path to load pdf.
+# Only the first page of each pdf is parsed, on a process pool, and the result
+# of every pdf is cached by its content hash, so a re-run after adding a new
+# monthly pdf only parses that file.
 
 from pdfminer.high_level import extract_text
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import hashlib
+import json
+import os
 import re
 import glob
 import pandas as pd
 
+CACHE_FILE = 'Vietnam_generation_cache.json'
+# the month and the total generation are on the first page
+PDF_PAGES = 1
+
 def get_pdf_files(file_path):
     """
     Gets all of the pdf files in the given directory.
@@ -28,7 +39,7 @@ def get_generation(file):
     """
     data = {}
     key_list = ['Year', 'Month', 'Country', 'Generation', 'Unit']
-    text1 = extract_text(file)
+    text1 = extract_text(file, maxpages=PDF_PAGES)
     
     # get year and month
     date = re.findall(r'\d+\/\d+', text1)[0]
@@ -49,17 +60,59 @@ def get_generation(file):
     
     return data
 
+def get_file_hash(file):
+    """
+    :param file: path of a pdf file
+    :return: sha256 hex digest of the file's content
+    """
+    with open(file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_cache(cache_file=CACHE_FILE):
+    """
+    :param cache_file: path of the cache file
+    :return: dictionary of content hash -> data points of the pdf
+    """
+    if not os.path.isfile(cache_file):
+        return {}
+    with open(cache_file) as f:
+        return json.load(f)
+
+def save_cache(cache, cache_file=CACHE_FILE):
+    """
+    Saves the cache atomically so an interrupted run never leaves it half written.
+    :param cache: dictionary of content hash -> data points of the pdf
+    :param cache_file: path of the cache file
+    """
+    with open(cache_file + '.tmp', 'w') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(cache_file + '.tmp', cache_file)
+
+def get_all_generation(pdf_files, workers=None, cache_file=CACHE_FILE):
+    """
+    Gets the data points of every pdf, parsing only the pdfs that are not in
+    the cache, in parallel.
+    :param pdf_files: list of pdf files
+    :param workers: number of processes, defaults to the number of CPUs
+    :param cache_file: path of the cache file
+    :return: a list of dictionaries of data points, in the order of pdf_files
+    """
+    cache = load_cache(cache_file)
+    hashes = [get_file_hash(file) for file in pdf_files]
+    new_files = {digest: file for digest, file in zip(hashes, pdf_files) if digest not in cache}
+    if new_files:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            cache.update(zip(new_files, executor.map(get_generation, new_files.values())))
+        save_cache(cache, cache_file)
+    return [cache[digest] for digest in hashes]
+
 def main():
     """
     This is the main function for getting total generation data from each pdf file
     and reading it to a single csv file.
     """
-    list_of_data = []
     pdf_files = get_pdf_files("Vietnam_data")
-    
-    for file in pdf_files:
-        data = get_generation(file)
-        list_of_data.append(data)
+    list_of_data = get_all_generation(pdf_files)
         
     df = pd.DataFrame(list_of_data, index=None).sort_values(by=['Year', 'Month'], ascending=False)
     df.to_csv('Vietnam_generation_data.csv', index=None)
@@ -0,0 +1,172 @@
+# Scrapes the system load (MW) and system marginal price (VND/kWh) of Vietnam
+# from the NLDC website (https://www.nldc.evn.vn), which serves the data of
+# its load chart one day per request. Days are fetched concurrently in batches
+# over one requests.Session (so connections are reused) with asyncio, and
+# written to Realtime_Vietnam_Data.csv in the same Date_Time, Region,
+# Data_Type, Unit, Value layout as the Japanese realtime scrapers.
+# A state file remembers the last complete day, so a run only fetches the days
+# since the previous one. The endpoint, its date parameter and the field names
+# of the response are the constants below; point --base-url at
+# nldc_stand_in_server.py to run against recorded responses.
+# The contract is UNVERIFIED: the endpoint, date parameter and field names
+# below are inferred from the load chart of the NLDC website, not checked
+# against a real response, and no real response is recorded in this
+# repository. The stand-in server only replays what this client recorded, so
+# it cannot catch a wrong contract. Before relying on the data, record a day
+# with --record DIR and check the constants against the saved json.
+# Run from the root of the repository:
+#   python -m data_scrapers.vietnam.vietnam_realtime_scraper --start 2022-01-01
+import argparse
+import asyncio
+import json
+import os
+from datetime import date, datetime, timedelta
+from data_scrapers import http_cache
+from data_scrapers.japan_realtime.realtime_writer import append_rows
+
+BASE_URL = 'https://www.nldc.evn.vn'
+# unverified, see the top of this file
+DAY_PATH = '/PhuTaiHeThong/GetChartPhuTaiVaGiaBien'
+DATE_PARAM = 'ngay'
+# field names of one point of the response
+TIME_FIELD = 'thoiGian'
+LOAD_FIELD = 'congSuat'
+PRICE_FIELD = 'giaBien'
+
+CSV_FILE = 'Realtime_Vietnam_Data.csv'
+STATE_FILE = 'Realtime_Vietnam_Fetch_State.json'
+# days fetched per batch; the state is saved after every batch
+BATCH_DAYS = 31
+CONCURRENCY = 4
+REQUEST_TIMEOUT = 60
+# first day fetched when there is no state and no --start
+DEFAULT_DAYS = 7
+
+# Data_Type, Unit and response field of every series
+SERIES = [('Load', 'MW', LOAD_FIELD), ('Price', 'VND/kWh', PRICE_FIELD)]
+
+def load_state(state_file=STATE_FILE):
+    """
+    :param state_file: path of the state file
+    :return: the last complete day fetched, None if the scraper never ran
+    """
+    if not os.path.isfile(state_file):
+        return None
+    with open(state_file) as f:
+        return date.fromisoformat(json.load(f)['last_day'])
+
+def save_state(last_day, state_file=STATE_FILE):
+    """
+    Saves the state atomically so an interrupted run never leaves it half written.
+    :param last_day: the last complete day fetched
+    :param state_file: path of the state file
+    """
+    with open(state_file + '.tmp', 'w') as f:
+        json.dump({'last_day': last_day.isoformat()}, f)
+    os.replace(state_file + '.tmp', state_file)
+
+def get_day_url(base_url=BASE_URL):
+    return base_url.rstrip('/') + DAY_PATH
+
+def parse_day(day, payload):
+    """
+    :param day: the date the response is for
+    :param payload: the decoded json response, a list of points
+    :return: a list of dictionaries of formatted data, one per point and series
+    """
+    data = []
+    for point in payload:
+        hour, minute = map(int, point[TIME_FIELD].split(':')[:2])
+        # the last point of a day is labelled 24:00
+        date_time = datetime(day.year, day.month, day.day) + timedelta(hours=hour, minutes=minute)
+        for data_type, unit, field in SERIES:
+            value = point.get(field)
+            data.append({'Date_Time': date_time,
+                         'Region': 'Vietnam',
+                         'Data_Type': data_type,
+                         'Unit': unit,
+                         'Value': float(value) if value is not None else None})
+    return data
+
+async def fetch_day(session, semaphore, day, base_url=BASE_URL, record_dir=None):
+    """
+    :param session: a requests.Session shared by all requests
+    :param semaphore: asyncio.Semaphore limiting the concurrent requests
+    :param day: the date to fetch
+    :param base_url: root url of the NLDC website or of a stand-in server
+    :param record_dir: folder to save the raw response to, as <day>.json
+    :return: a tuple (day, payload)
+    """
+    url = get_day_url(base_url)
+    async with semaphore:
+        r = await asyncio.to_thread(session.get, url, params={DATE_PARAM: day.strftime('%d/%m/%Y')},
+                                    timeout=REQUEST_TIMEOUT)
+    if r.status_code != 200:
+        raise Exception('Failed to load page {}'.format(r.url))
+    payload = r.json()
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+        with open(os.path.join(record_dir, day.isoformat() + '.json'), 'w') as f:
+            json.dump(payload, f)
+    return day, payload
+
+async def fetch_days(start, end, session, base_url=BASE_URL, concurrency=CONCURRENCY,
+                     batch_days=BATCH_DAYS, csv_file=CSV_FILE, state_file=STATE_FILE, record_dir=None):
+    """
+    Fetches every day from start to end in batches, writing each batch and
+    saving the state before the next one starts.
+    :param start: first day to fetch
+    :param end: last day to fetch
+    :param session: a requests.Session shared by all requests
+    :param base_url: root url of the NLDC website or of a stand-in server
+    :param concurrency: maximum number of requests at the same time
+    :param batch_days: number of days per batch
+    :param csv_file: path of the output csv
+    :param state_file: path of the state file
+    :param record_dir: folder to save the raw responses to
+    :return: number of rows written
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    written = 0
+    for i in range(0, len(days), batch_days):
+        batch = await asyncio.gather(*(fetch_day(session, semaphore, day, base_url, record_dir)
+                                       for day in days[i:i + batch_days]))
+        data = [row for day, payload in batch for row in parse_day(day, payload)]
+        written += append_rows(csv_file, data)
+        # today is still being published, so it is fetched again next run
+        complete = [day for day, payload in batch if day < date.today()]
+        if complete:
+            save_state(max(complete), state_file)
+    return written
+
+def main(session=None, start=None, end=None, base_url=BASE_URL, record_dir=None):
+    """
+    Fetches every day since the last complete day of the previous run.
+    :param session: requests.Session to use, by default a new one using the
+                    configured http_cache
+    :param start: first day to fetch, defaults to the day after the state's last day
+    :param end: last day to fetch, defaults to today
+    :param base_url: root url of the NLDC website or of a stand-in server
+    :param record_dir: folder to save the raw responses to
+    :return: number of rows written
+    """
+    if start is None:
+        last_day = load_state()
+        start = last_day + timedelta(days=1) if last_day else date.today() - timedelta(days=DEFAULT_DAYS)
+    end = end or date.today()
+    if start > end:
+        return 0
+    if session is not None:
+        return asyncio.run(fetch_days(start, end, session, base_url, record_dir=record_dir))
+    with http_cache.new_session() as session:
+        return asyncio.run(fetch_days(start, end, session, base_url, record_dir=record_dir))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetch the load and price data of Vietnam.')
+    parser.add_argument('--start', type=date.fromisoformat, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, help='last day, YYYY-MM-DD')
+    parser.add_argument('--base-url', default=BASE_URL, help='root url of the API or a stand-in server')
+    parser.add_argument('--record', metavar='DIR', help='save the raw responses to DIR')
+    args = parser.parse_args()
+    main(start=args.start, end=args.end, base_url=args.base_url, record_dir=args.record)
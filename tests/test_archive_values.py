@@ -0,0 +1,76 @@
+# Checks the values the Chugoku and Shikoku archive loaders return on
+# synthetic files (see benchmarks/synthetic_files.py): both files are in
+# 10MWh with placeholders for missing values, so every value must be the
+# file's number times ten, and missing where the file has a placeholder.
+# Chubu's files are in 万kWh too, converted to MWh by the national dataset.
+# Run from the root of the repository:
+#   python -m pytest tests
+import numpy as np
+import pandas as pd
+from benchmarks import synthetic_files
+from data_scrapers.japan_archive.archive_sync import SyncedFile
+from data_scrapers.japan_archive.national_dataset import normalize_demand, normalize_supply
+from data_scrapers.japan_chubu import japan_chubu
+from data_scrapers.japan_chugoku import japan_chugoku
+from data_scrapers.japan_shikoku import japan_shikoku
+
+START = pd.Timestamp('2021-04-01')
+HOURS = 14 * 24
+
+def use_local_file(monkeypatch, module, path, url_functions):
+    """
+    Makes a loader read a local file instead of downloading its archive.
+    """
+    for name in url_functions:
+        monkeypatch.setattr(module, name, lambda *args: [path])
+    def sync_files(source, urls, session=None, headers=None, parse=None, **kwargs):
+        return [SyncedFile(path, path, True, parse(path))]
+    monkeypatch.setattr(module, 'sync_files', sync_files)
+
+def check_values(demand_df, supply_df, expected_demand):
+    """
+    :param expected_demand: the file's demand column, in MWh, in chronological order
+    """
+    demand = demand_df.sort_values('Date_Time')['Area_Demand'].astype('float64').to_numpy()
+    np.testing.assert_array_equal(demand, expected_demand.to_numpy(dtype='float64'))
+    # the synthetic values are 0-1499 (10MWh)
+    supply = supply_df['Supply'].astype('float64').dropna()
+    assert np.isfinite(supply).all()
+    assert supply.between(0, 14990).all()
+
+def test_chugoku_values(tmp_path, monkeypatch):
+    path = str(tmp_path / 'chugoku.csv')
+    with open(path, 'wb') as f:
+        f.write(synthetic_files.make_chugoku_csv(START, HOURS))
+    use_local_file(monkeypatch, japan_chugoku, path, ['get_csv_urls'])
+    raw = pd.read_csv(path, header=2).dropna(how='all')
+    demand_df, supply_df = japan_chugoku.read_chugoku_data()
+
+    check_values(demand_df, supply_df, pd.to_numeric(raw['VALUE_0'], errors='coerce') * 10)
+    assert demand_df['Area_Demand'].isna().any() # the '|' placeholders
+
+def test_shikoku_values(tmp_path, monkeypatch):
+    path = str(tmp_path / 'shikoku.xlsx')
+    with open(path, 'wb') as f:
+        f.write(synthetic_files.make_shikoku_excel(START, HOURS))
+    use_local_file(monkeypatch, japan_shikoku, path, ['get_page', 'get_excel_urls'])
+    raw = pd.read_excel(path, skiprows=8, usecols=range(0, 14), skipfooter=1)
+    demand_df, supply_df = japan_shikoku.read_shikoku_data()
+
+    check_values(demand_df, supply_df, pd.to_numeric(raw.iloc[:, 2], errors='coerce') * 10)
+    assert demand_df['Area_Demand'].isna().any() # the '－' placeholders
+
+def test_chubu_national_values(tmp_path, monkeypatch):
+    path = str(tmp_path / 'chubu.csv')
+    with open(path, 'wb') as f:
+        f.write(synthetic_files.make_chubu_csv(START, HOURS))
+    use_local_file(monkeypatch, japan_chubu, path, [])
+    raw = pd.read_csv(path, header=4, encoding='shift_jis')
+    demand_df, supply_df = japan_chubu.read_chubu_csv()
+    demand_df = normalize_demand(demand_df, 'Chubu')
+    supply_df = normalize_supply(supply_df, 'Chubu')
+
+    check_values(demand_df, supply_df, raw.iloc[:, 2].astype('float64') * 10)
+    assert (demand_df['Unit'] == 'MWh').all()
+    first_hour = supply_df[supply_df['Date_Time'] == START]
+    assert first_hour.set_index('Fuel_Type').loc['Thermal', 'Supply'] == raw.iloc[0, 4] * 10
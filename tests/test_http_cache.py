@@ -0,0 +1,60 @@
+# Checks that http_cache serves a redirected url like requests does, in every
+# mode, against a local server that redirects /old to /new.
+# Run from the root of the repository:
+#   python -m pytest tests
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from data_scrapers import http_cache
+
+BODY = b'DATE,TIME,VALUE\r\n2022/5/1,0:00,1234\r\n'
+
+class RedirectHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/old':
+            self.send_response(301)
+            self.send_header('Location', '/new')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/csv')
+            self.send_header('Content-Length', str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RedirectHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(autouse=True)
+def reset_cache():
+    yield
+    http_cache.configure(None)
+
+def test_redirects_in_every_mode(server, tmp_path):
+    url = 'http://127.0.0.1:{}/old'.format(server.server_port)
+    assert requests.get(url).content == BODY
+
+    for mode in http_cache.MODES:
+        http_cache.configure(mode, str(tmp_path), max_age=0 if mode == 'refresh' else 3600)
+        r = http_cache.get(url)
+        assert r.status_code == 200
+        assert r.content == BODY
+        assert [response.status_code for response in r.history] == [301]
+        # cached responses have no raw stream
+        assert b''.join(r.iter_content(8)) == BODY
+        r.close()
+
+    # both hops were recorded, so the redirect is replayed without the server
+    server.shutdown()
+    http_cache.configure('replay', str(tmp_path))
+    assert http_cache.get(url).content == BODY
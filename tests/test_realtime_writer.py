@@ -0,0 +1,43 @@
+# Checks that realtime_writer.append_rows writes each (Date_Time, Data_Type)
+# once, and starts over when the csv is deleted or emptied while its key index
+# stays.
+# Run from the root of the repository:
+#   python -m pytest tests
+import csv
+import os
+from datetime import datetime
+from data_scrapers.japan_realtime.realtime_writer import append_rows, get_index_dir
+
+def make_rows(hour):
+    return [{'Date_Time': datetime(2022, 5, 1, hour), 'Region': 'Kyushu', 'Data_Type': data_type,
+             'Unit': 'MW', 'Value': 1000 + hour} for data_type in ('Actual', 'Forecast')]
+
+def read_csv(csv_file):
+    with open(csv_file, newline='') as f:
+        return list(csv.DictReader(f))
+
+def test_rows_written_once(tmp_path):
+    csv_file = str(tmp_path / 'Realtime_Kyushu_Data.csv')
+    assert append_rows(csv_file, make_rows(0)) == 2
+    assert append_rows(csv_file, make_rows(0) + make_rows(1)) == 2
+    assert len(read_csv(csv_file)) == 4
+
+def test_deleted_csv_is_written_again(tmp_path):
+    csv_file = str(tmp_path / 'Realtime_Kyushu_Data.csv')
+    append_rows(csv_file, make_rows(0))
+    os.remove(csv_file)
+    assert os.path.isdir(get_index_dir(csv_file))
+
+    assert append_rows(csv_file, make_rows(0)) == 2
+    rows = read_csv(csv_file)
+    assert [row['Data_Type'] for row in rows] == ['Actual', 'Forecast']
+    # the rebuilt index still skips the rows just written
+    assert append_rows(csv_file, make_rows(0)) == 0
+
+def test_emptied_csv_is_written_again(tmp_path):
+    csv_file = str(tmp_path / 'Realtime_Kyushu_Data.csv')
+    append_rows(csv_file, make_rows(0))
+    open(csv_file, 'w').close()
+
+    assert append_rows(csv_file, make_rows(0)) == 2
+    assert len(read_csv(csv_file)) == 2
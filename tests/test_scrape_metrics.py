@@ -0,0 +1,53 @@
+# Checks that python -m data_scrapers reports a source as failed in its
+# metrics when it fails outside every measured stage, or when its worker
+# process dies.
+# Run from the root of the repository:
+#   python -m pytest tests
+import os
+import pytest
+from data_scrapers import __main__ as orchestrator
+from data_scrapers.scrape_metrics import format_prometheus, measure_stage, pop_records, summarize
+
+@pytest.fixture(autouse=True)
+def clear_records():
+    # the loaders run by other tests leave their stages in this process
+    pop_records()
+
+def fail_before_stages(region):
+    raise Exception('Failed to load page https://example.com/{}'.format(region))
+
+def fail_in_stage(region):
+    with measure_stage('archive', region, 'fetch'):
+        raise Exception('Failed to load page https://example.com/{}'.format(region))
+
+def crash_worker(region):
+    os._exit(1)
+
+def test_failure_outside_stages(monkeypatch):
+    monkeypatch.setitem(orchestrator.RUNNERS, 'archive', fail_before_stages)
+    result = orchestrator.run_source('archive', 'Kyushu', {})
+    assert result.error is not None
+    assert [stage.stage for stage in result.stages] == ['run']
+
+    run = summarize(result.stages)[('archive', 'Kyushu')]
+    assert run['success'] is False
+    assert 'scraper_last_run_success{scraper="archive",source="Kyushu"} 0' in \
+        format_prometheus(summarize(result.stages))
+
+def test_failure_in_stage(monkeypatch):
+    monkeypatch.setitem(orchestrator.RUNNERS, 'archive', fail_in_stage)
+    result = orchestrator.run_source('archive', 'Kyushu', {})
+    assert [(stage.stage, stage.error) for stage in result.stages] == [('fetch', 'Exception'),
+                                                                      ('run', 'Exception')]
+    assert summarize(result.stages)[('archive', 'Kyushu')]['success'] is False
+
+def test_worker_crash(monkeypatch):
+    # the workers are forked, so they see the replaced runner
+    monkeypatch.setitem(orchestrator.RUNNERS, 'archive', crash_worker)
+    results = orchestrator.run_sources([('archive', 'Kyushu')], {}, workers=1)
+    assert len(results) == 1
+    result = results[0]
+    assert (result.mode, result.source, result.rows) == ('archive', 'Kyushu', None)
+    assert 'BrokenProcessPool' in result.error
+    assert [(stage.stage, stage.error) for stage in result.stages] == [('run', 'BrokenProcessPool')]
+    assert summarize(result.stages)[('archive', 'Kyushu')]['success'] is False